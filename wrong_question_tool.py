@@ -15,6 +15,19 @@ import shutil
 import json
 import threading
 import datetime
+import time
+import heapq
+import bisect
+import itertools
+import hashlib
+import ctypes
+import ctypes.util
+import select
+import struct
+import errno
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import multiprocessing
 from PIL import Image, ImageTk, ImageEnhance, ImageFilter, ImageDraw
 import pytesseract
 import cv2
@@ -22,11 +35,2899 @@ import numpy as np
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab import rl_config
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from docx import Document
-from docx.shared import Inches
+from docx.shared import Inches, Pt
 import sys
 import platform
 import webbrowser
+import io
+import zipfile
+import zlib
+
+# OCR预处理方案
+OCR_RECIPES = {
+    "otsu": "灰度 + 全局Otsu阈值",
+    "adaptive": "灰度 + 自适应阈值",
+    "flatten_otsu": "背景光照校正 + Otsu阈值",
+    "denoise_otsu": "非局部均值去噪 + Otsu阈值",
+    "median_adaptive": "中值滤波 + 自适应阈值",
+    "gray": "仅灰度（不二值化）"
+}
+
+# 导出图片质量方案（按实际绘制尺寸和有效DPI重采样）
+EXPORT_PROFILES = {
+    "screen": {"label": "屏幕阅读 (150 DPI)", "dpi": 150, "jpeg_quality": 75, "grayscale": False},
+    "standard": {"label": "标准 (200 DPI)", "dpi": 200, "jpeg_quality": 85, "grayscale": False},
+    "print": {"label": "高质量打印 (300 DPI)", "dpi": 300, "jpeg_quality": 90, "grayscale": False},
+    "grayscale": {"label": "黑白打印 (200 DPI 灰度)", "dpi": 200, "jpeg_quality": 80, "grayscale": True}
+}
+
+# 图片数据以二进制流写入PDF，不做ASCII85编码（纯Python编码很慢且使文件增大25%）
+rl_config.useA85 = 0
+
+# 任务优先级（数值越小越优先）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF)
+
+class TaskCancelled(Exception):
+    """任务被取消"""
+
+class Task:
+    """调度器中的任务，提供协作式取消和进度报告"""
+    
+    def __init__(self, name, func, pool, priority, on_done=None, on_error=None, on_cancel=None):
+        self.name = name
+        self.func = func
+        self.pool = pool
+        self.priority = priority
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()
+        self.done = 0
+        self.total = None
+        self.message = ""
+        # 吞吐量从首次报告已知总数的进度起算
+        self.progress_started = None
+        self.progress_start_done = 0
+    
+    def cancel(self):
+        """请求取消任务"""
+        self.cancel_event.set()
+    
+    def is_cancelled(self):
+        """是否已请求取消"""
+        return self.cancel_event.is_set()
+    
+    def check_cancelled(self):
+        """取消检查点，已请求取消时抛出TaskCancelled"""
+        if self.cancel_event.is_set():
+            raise TaskCancelled(self.name)
+    
+    def report(self, done, total=None, message=None):
+        """报告进度（只记录最新值，由界面泵节流刷新）"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        if self.progress_started is None and self.total:
+            self.progress_started = time.monotonic()
+            self.progress_start_done = done
+    
+    def rate_text(self):
+        """吞吐量和预计剩余时间说明，进度不足以估计时返回空字符串"""
+        if not self.total or self.progress_started is None:
+            return ""
+        elapsed = time.monotonic() - self.progress_started
+        done = self.done - self.progress_start_done
+        if elapsed < 1 or done <= 0:
+            return ""
+        rate = done / elapsed
+        remaining = int((self.total - self.done) / rate)
+        if remaining >= 60:
+            remaining_text = f"{remaining // 60}分{remaining % 60:02d}秒"
+        else:
+            remaining_text = f"{remaining}秒"
+        return f"{rate:.1f}项/秒，剩余约{remaining_text}"
+
+class ProcessCancelToken:
+    """子进程中代替Task使用的取消标志，包装跨进程的Event；子进程不向界面报告进度"""
+    
+    def __init__(self, name, event):
+        self.name = name
+        self.event = event
+    
+    def check_cancelled(self):
+        """取消检查点，已请求取消时抛出TaskCancelled"""
+        if self.event.is_set():
+            raise TaskCancelled(self.name)
+    
+    def report(self, done, total=None, message=None):
+        """子进程的进度由父进程按完成的文档汇总，这里忽略"""
+
+class TaskScheduler:
+    """中央任务调度器
+    
+    按优先级从有界的CPU/IO线程池中调度任务，后台任务的并发数受限，
+    保证交互任务总有空闲线程。所有界面回调都经由一个节流的root.after泵执行。
+    """
+    
+    def __init__(self, root, cpu_workers=None, io_workers=4, background_limit=1):
+        self.root = root
+        self.condition = threading.Condition()
+        self.queues = {"cpu": [], "io": []}
+        self.running = []
+        self.background_running = {"cpu": 0, "io": 0}
+        self.background_limit = background_limit
+        self.sequence = itertools.count()
+        self.ui_callbacks = deque()
+        self.progress_listener = None
+        self.pump_interval = 100
+        self.is_shutdown = False
+        self.threads = []
+        
+        worker_counts = {"cpu": cpu_workers or max(2, os.cpu_count() or 2), "io": io_workers}
+        for pool, count in worker_counts.items():
+            for _ in range(count):
+                thread = threading.Thread(target=self.worker_loop, args=(pool,))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        
+        # 任务内部的逐项工作（单张图片、单个文件）共用这两个有界线程池，
+        # 同时运行多个导出、备份时总线程数不变
+        self.item_workers = {"cpu": worker_counts["cpu"], "io": min(8, worker_counts["cpu"] * 2)}
+        self.executors = {pool: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"{pool}-item")
+                          for pool, count in self.item_workers.items()}
+    
+    def submit(self, name, func, pool="cpu", priority=PRIORITY_INTERACTIVE,
+               on_done=None, on_error=None, on_cancel=None):
+        """提交任务，func(task)在工作线程中执行，回调在界面线程中执行"""
+        task = Task(name, func, pool, priority, on_done, on_error, on_cancel)
+        with self.condition:
+            if self.is_shutdown:
+                raise RuntimeError("任务调度器已关闭")
+            heapq.heappush(self.queues[pool], (priority, next(self.sequence), task))
+            self.condition.notify_all()
+        return task
+    
+    def item_pool(self, pool="cpu"):
+        """任务内部提交逐项工作用的共享线程池"""
+        return SharedPool(self.executors[pool])
+    
+    def call_in_ui(self, callback, *args):
+        """在界面线程中执行回调（可从任意线程调用）"""
+        if callback is not None:
+            self.ui_callbacks.append((callback, args))
+    
+    def next_task(self, pool):
+        """取出可运行的最高优先级任务，调用时需持有锁"""
+        queue = self.queues[pool]
+        while queue:
+            priority, _, task = queue[0]
+            if task.is_cancelled():
+                heapq.heappop(queue)
+                self.call_in_ui(task.on_cancel)
+                continue
+            if priority >= PRIORITY_BACKGROUND and self.background_running[pool] >= self.background_limit:
+                return None
+            heapq.heappop(queue)
+            return task
+        return None
+    
+    def worker_loop(self, pool):
+        """工作线程主循环"""
+        while True:
+            with self.condition:
+                task = None
+                while not self.is_shutdown:
+                    task = self.next_task(pool)
+                    if task is not None:
+                        break
+                    self.condition.wait()
+                if task is None:
+                    return
+                self.running.append(task)
+                if task.priority >= PRIORITY_BACKGROUND:
+                    self.background_running[pool] += 1
+            
+            try:
+                result = task.func(task)
+                self.call_in_ui(task.on_done, result)
+            except TaskCancelled:
+                self.call_in_ui(task.on_cancel)
+            except Exception as e:
+                print(f"任务失败 {task.name}: {e}")
+                self.call_in_ui(task.on_error, e)
+            finally:
+                with self.condition:
+                    self.running.remove(task)
+                    if task.priority >= PRIORITY_BACKGROUND:
+                        self.background_running[pool] -= 1
+                    self.condition.notify_all()
+    
+    def active_tasks(self):
+        """获取正在运行的任务列表"""
+        with self.condition:
+            return list(self.running)
+    
+    def cancel_all(self, include_background=False):
+        """取消排队中和运行中的任务"""
+        with self.condition:
+            tasks = list(self.running)
+            for queue in self.queues.values():
+                tasks.extend(entry[2] for entry in queue)
+            for task in tasks:
+                if include_background or task.priority < PRIORITY_BACKGROUND:
+                    task.cancel()
+            self.condition.notify_all()
+    
+    def start_pump(self, progress_listener=None, interval=100):
+        """启动界面更新泵"""
+        self.progress_listener = progress_listener
+        self.pump_interval = interval
+        self.root.after(interval, self.pump)
+    
+    def pump(self):
+        """执行排队的界面回调并刷新进度（每次限时，避免阻塞界面）"""
+        deadline = time.monotonic() + 0.05
+        while self.ui_callbacks and time.monotonic() < deadline:
+            callback, args = self.ui_callbacks.popleft()
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"界面回调失败: {e}")
+        
+        if self.progress_listener is not None:
+            self.progress_listener(self.active_tasks())
+        
+        if not self.is_shutdown:
+            self.root.after(self.pump_interval, self.pump)
+    
+    def shutdown(self, timeout=2.0):
+        """取消所有任务并等待工作线程退出"""
+        self.cancel_all(include_background=True)
+        with self.condition:
+            self.is_shutdown = True
+            self.condition.notify_all()
+        
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+class SharedPool:
+    """在共享线程池上提交一组子任务，用法与临时ThreadPoolExecutor相同
+    
+    退出with块时取消尚未开始的子任务并等待已开始的结束，但不关闭共享线程池。
+    已完成的子任务不再引用，结果的内存随调用者释放。
+    """
+    
+    def __init__(self, executor):
+        self.executor = executor
+        self.futures = set()
+        self.lock = threading.Lock()
+    
+    def submit(self, func, *args):
+        """提交子任务"""
+        future = self.executor.submit(func, *args)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.forget)
+        return future
+    
+    def forget(self, future):
+        """子任务完成后不再引用"""
+        with self.lock:
+            self.futures.discard(future)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        return False
+
+def worker_pool(pool, max_workers):
+    """任务内部的逐项线程池：提供了调度器的共享池时使用它，否则（如在子进程中）创建临时线程池"""
+    return pool if pool is not None else ThreadPoolExecutor(max_workers=max_workers)
+
+def question_files(image_path):
+    """题目图片及其附属文件（元数据、OCR文本、OCR词框、旧版备份）的路径，不检查是否存在"""
+    base = os.path.splitext(image_path)[0]
+    return [image_path, f"{base}.meta", f"{base}_ocr.txt", f"{base}_ocr.npz", f"{image_path}.backup"]
+
+def file_sha256(path):
+    """计算文件内容的SHA256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_sha1(path):
+    """计算文件内容的SHA1（图片尺寸缓存和渲染缓存使用的内容哈希）"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def question_file_pairs(path, new_path):
+    """文件夹或题目移动、改名时要一起处理的(源, 目标)路径对，题目包含其存在的附属文件"""
+    if os.path.isdir(path):
+        return [(path, new_path)]
+    return [(src, dst) for src, dst in zip(question_files(path), question_files(new_path)) if os.path.exists(src)]
+
+def unique_question_path(target_dir, name, label, is_dir=False):
+    """目标目录中不与已有文件冲突的路径（题目连同附属文件名一起检查），冲突时加 _<label>序号"""
+    base, ext = os.path.splitext(name)
+    target_path = os.path.join(target_dir, name)
+    counter = 1
+    while any(os.path.exists(path) for path in ([target_path] if is_dir else question_files(target_path))):
+        target_path = os.path.join(target_dir, f"{base}_{label}{counter}{ext}")
+        counter += 1
+    return target_path
+
+def copy_file_fast(src, dst):
+    """复制文件并保留修改时间；内容由内核直接复制（copy_file_range，其次sendfile），不经过Python缓冲区"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        copied = 0
+        finished = False
+        for method in ("copy_file_range", "sendfile"):
+            if finished or not hasattr(os, method):
+                continue
+            try:
+                os.lseek(out_fd, copied, os.SEEK_SET)
+                while True:
+                    if method == "copy_file_range":
+                        sent = os.copy_file_range(in_fd, out_fd, 64 * 1024 * 1024, copied, copied)
+                    else:
+                        sent = os.sendfile(out_fd, in_fd, copied, 64 * 1024 * 1024)
+                    if sent == 0:
+                        break
+                    copied += sent
+                finished = True
+            except OSError as e:
+                # 文件系统或内核不支持时换下一种方式，从已复制的位置继续
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                   errno.ENOTSUP, errno.EBADF):
+                    raise
+        if not finished:
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+def copy_path(src, dst):
+    """复制文件或整个文件夹"""
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=copy_file_fast)
+    else:
+        copy_file_fast(src, dst)
+
+def move_path(src, dst):
+    """移动文件或文件夹：同一文件系统上只是一次重命名，否则复制后删除源"""
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        copy_path(src, dst)
+        if os.path.isdir(src):
+            shutil.rmtree(src)
+        else:
+            os.remove(src)
+
+def transfer_items(paths, target_dir, move=False, task=None, results=None):
+    """把文件夹或题目（含附属文件）复制或移动到target_dir，重名时自动改名
+    
+    results收集{"done": [(源, 目标)], "failed": [(源, 错误)]}，任务取消时已完成的部分仍记录在其中。
+    """
+    if results is None:
+        results = {"done": [], "failed": []}
+    target_dir = os.path.abspath(target_dir)
+    label = "move" if move else "copy"
+    for index, path in enumerate(paths):
+        if task:
+            task.check_cancelled()
+            task.report(index, len(paths), os.path.basename(path))
+        try:
+            is_dir = os.path.isdir(path)
+            if move and os.path.dirname(os.path.abspath(path)) == target_dir:
+                continue
+            if is_dir and (target_dir + os.sep).startswith(os.path.abspath(path) + os.sep):
+                raise ValueError("不能复制或移动到自身的子文件夹中")
+            target_path = unique_question_path(target_dir, os.path.basename(path), label, is_dir)
+            for src, dst in question_file_pairs(path, target_path):
+                if move:
+                    move_path(src, dst)
+                else:
+                    copy_path(src, dst)
+            results["done"].append((path, target_path))
+        except Exception as e:
+            results["failed"].append((path, e))
+    return results
+
+def plan_batch_rename(directory, renames):
+    """检查批量重命名[(旧名, 新名)]并展开各题目的附属文件
+    
+    返回(可执行的分组[[(旧文件名, 新文件名)]], 冲突{旧名: 原因})。检查都基于集合和字典查找，整体O(n)；
+    互换名字这类循环改名由两阶段执行处理，不算冲突。某项因冲突保留原名时，以它的原名为目标的项也会被标为冲突。
+    """
+    existing = {os.path.normcase(name) for name in os.listdir(directory)}
+    conflicts = {}
+    groups = {}
+    for old_name, new_name in renames:
+        if new_name == old_name:
+            continue
+        if not new_name or new_name in (".", "..") or "/" in new_name or os.sep in new_name:
+            conflicts[old_name] = "名称无效"
+            continue
+        pairs = question_file_pairs(os.path.join(directory, old_name), os.path.join(directory, new_name))
+        if not pairs:
+            conflicts[old_name] = "文件不存在"
+            continue
+        groups[old_name] = [(os.path.basename(src), os.path.basename(dst)) for src, dst in pairs]
+    
+    sources = {os.path.normcase(src): old_name for old_name, pairs in groups.items() for src, _ in pairs}
+    owners = {}
+    for old_name, pairs in groups.items():
+        for _, dst in pairs:
+            key = os.path.normcase(dst)
+            if key in owners:
+                conflicts[old_name] = f"与 {owners[key]} 的新名称相同"
+            elif key in existing and key not in sources:
+                conflicts[old_name] = "已存在同名文件"
+            else:
+                owners[key] = old_name
+    
+    # 保留原名的项继续占用原名，以这些名字为目标的项也无法执行
+    pending = deque(old_name for old_name in list(conflicts) if old_name in groups)
+    while pending:
+        old_name = pending.popleft()
+        for src, _ in groups[old_name]:
+            owner = owners.get(os.path.normcase(src))
+            if owner is not None and owner not in conflicts:
+                conflicts[owner] = f"目标名称被 {old_name} 占用"
+                pending.append(owner)
+    
+    return [pairs for old_name, pairs in groups.items() if old_name not in conflicts], conflicts
+
+def write_rename_journal(journal_path, journal):
+    """原子写入重命名日志并落盘"""
+    temp_file = journal_path + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(journal, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, journal_path)
+
+# 同一时间只执行一个批量重命名（日志文件只有一份）
+_rename_lock = threading.Lock()
+
+def execute_batch_rename(directory, groups, journal_path, task=None):
+    """两阶段执行批量重命名：先把所有文件改为隐藏的临时名，再改为目标名
+    
+    开始前把全部步骤写入日志，程序中途退出时由run_rename_journal按日志继续完成。
+    返回[(旧路径, 新路径)]，每个题目或文件夹一项；之前出错留下的日志先按日志完成，
+    其结果一并返回。
+    """
+    if not _rename_lock.acquire(blocking=False):
+        raise RuntimeError("另一个批量重命名尚未完成，请稍后再试")
+    try:
+        # 没有正在执行的重命名时仍有日志，说明上一次在第二阶段出错，先把它完成
+        renamed = recover_batch_rename(journal_path)
+        batch_id = f"{time.time_ns():x}"
+        counter = itertools.count()
+        journal = {
+            "directory": directory,
+            "phase": 1,
+            "groups": [[[src, f".rename_{batch_id}_{next(counter)}", dst] for src, dst in pairs] for pairs in groups]
+        }
+        write_rename_journal(journal_path, journal)
+        return renamed + run_rename_journal(journal_path, journal, task)
+    finally:
+        _rename_lock.release()
+
+def run_rename_journal(journal_path, journal, task=None):
+    """按日志执行（或继续执行）两阶段重命名，每一步都可重复执行，完成后删除日志"""
+    directory = journal["directory"]
+    groups = journal["groups"]
+    total = 2 * len(groups)
+    
+    if journal["phase"] == 1:
+        done = []
+        try:
+            for index, steps in enumerate(groups):
+                if task:
+                    task.report(index, total, "重命名")
+                for src, temp, _ in steps:
+                    src_path = os.path.join(directory, src)
+                    temp_path = os.path.join(directory, temp)
+                    if os.path.exists(src_path) and not os.path.exists(temp_path):
+                        os.rename(src_path, temp_path)
+                        done.append((src_path, temp_path))
+        except BaseException:
+            # 第一阶段失败时全部改回原名，文件夹保持原样
+            for src_path, temp_path in reversed(done):
+                os.rename(temp_path, src_path)
+            os.remove(journal_path)
+            raise
+        journal["phase"] = 2
+        write_rename_journal(journal_path, journal)
+    
+    renamed = []
+    for index, steps in enumerate(groups):
+        if task:
+            task.report(len(groups) + index, total, "重命名")
+        steps = [step for step in steps if os.path.exists(os.path.join(directory, step[1]))]
+        if not steps:
+            continue
+        # 临时阶段外部新建了同名文件时，整组加后缀，不覆盖已有文件
+        base = os.path.splitext(steps[0][2])[0]
+        suffix = ""
+        counter = 1
+        while any(os.path.exists(os.path.join(directory, dst.replace(base, base + suffix, 1))) for _, _, dst in steps):
+            suffix = f"_renamed{counter}"
+            counter += 1
+        for _, temp, dst in steps:
+            os.rename(os.path.join(directory, temp), os.path.join(directory, dst.replace(base, base + suffix, 1)))
+        renamed.append((os.path.join(directory, steps[0][0]),
+                        os.path.join(directory, steps[0][2].replace(base, base + suffix, 1))))
+    
+    os.remove(journal_path)
+    return renamed
+
+def recover_batch_rename(journal_path):
+    """继续完成上次中断（程序退出或出错）的批量重命名，返回[(旧路径, 新路径)]"""
+    if not os.path.exists(journal_path):
+        return []
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        journal = json.load(f)
+    return run_rename_journal(journal_path, journal)
+
+def get_ocr_words_path(image_path):
+    """获取词级OCR数据文件路径"""
+    base_name = os.path.splitext(image_path)[0]
+    return f"{base_name}_ocr.npz"
+
+def save_ocr_words(image_path, words):
+    """保存词级OCR数据（压缩的列式npz文件）；words中的image_digest为识别时图片内容的哈希"""
+    with open(get_ocr_words_path(image_path), 'wb') as f:
+        np.savez_compressed(f, **words)
+
+def load_ocr_words(image_path):
+    """读取词级OCR数据，不存在时返回None"""
+    words_file = get_ocr_words_path(image_path)
+    if not os.path.exists(words_file):
+        return None
+    try:
+        with np.load(words_file, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    except Exception as e:
+        print(f"读取词级OCR数据失败: {e}")
+        return None
+
+# 中文字体候选（TrueType字体，导出时reportlab只嵌入用到的字形子集）
+CJK_FONT_CANDIDATES = [
+    ("C:/Windows/Fonts/simhei.ttf", 0),
+    ("C:/Windows/Fonts/msyh.ttc", 0),
+    ("C:/Windows/Fonts/simsun.ttc", 0),
+    ("/System/Library/Fonts/STHeiti Light.ttc", 0),
+    ("/System/Library/Fonts/Supplemental/Arial Unicode.ttf", 0),
+    ("/Library/Fonts/Arial Unicode.ttf", 0),
+    ("/usr/share/fonts/truetype/wqy/wqy-microhei.ttc", 0),
+    ("/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", 0),
+    ("/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf", 0),
+    ("/usr/share/fonts/truetype/arphic/uming.ttc", 0)
+]
+
+_cjk_font_name = None
+_cjk_font_lock = threading.Lock()
+
+def register_cjk_font():
+    """注册中文字体并返回字体名；找不到系统字体时使用reportlab内置的CID字体（不嵌入）"""
+    global _cjk_font_name
+    with _cjk_font_lock:
+        if _cjk_font_name is None:
+            for font_path, subfont_index in CJK_FONT_CANDIDATES:
+                if not os.path.exists(font_path):
+                    continue
+                try:
+                    pdfmetrics.registerFont(TTFont("CJK", font_path, subfontIndex=subfont_index))
+                    _cjk_font_name = "CJK"
+                    break
+                except Exception as e:
+                    print(f"加载中文字体失败 {font_path}: {e}")
+            else:
+                pdfmetrics.registerFont(UnicodeCIDFont("STSong-Light"))
+                _cjk_font_name = "STSong-Light"
+        return _cjk_font_name
+
+class ImageInfoCache:
+    """图片尺寸缓存
+    
+    以路径为键，按文件大小和修改时间校验，避免导出排版时重复打开图片、
+    重复计算内容哈希；缓存持久化到JSON文件。条目为[大小, 修改时间, 宽, 高, 哈希]，
+    哈希在首次需要时才计算。
+    """
+    
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"加载图片尺寸缓存失败: {e}")
+    
+    def lookup(self, path, stat):
+        """返回仍然有效的缓存条目，文件已变化时返回None"""
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry
+        return None
+    
+    def get_size(self, path):
+        """获取图片尺寸(宽, 高)，缓存失效时读取文件头"""
+        stat = os.stat(path)
+        entry = self.lookup(path, stat)
+        if entry:
+            return entry[2], entry[3]
+        
+        with Image.open(path) as image:
+            width, height = image.size
+        with self.lock:
+            self.entries[path] = [stat.st_size, stat.st_mtime_ns, width, height]
+            self.dirty = True
+        return width, height
+    
+    def get_digest(self, path):
+        """获取文件内容的SHA1，缓存失效时重新计算"""
+        stat = os.stat(path)
+        entry = self.lookup(path, stat)
+        if entry and len(entry) > 4:
+            return entry[4]
+        
+        digest = file_sha1(path)
+        
+        if entry:
+            entry = entry[:4] + [digest]
+        else:
+            with Image.open(path) as image:
+                width, height = image.size
+            entry = [stat.st_size, stat.st_mtime_ns, width, height, digest]
+        with self.lock:
+            self.entries[path] = entry
+            self.dirty = True
+        return digest
+    
+    def save(self):
+        """保存缓存（无变化时跳过）"""
+        if not self.cache_file:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        
+        try:
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存图片尺寸缓存失败: {e}")
+
+class RenderCache:
+    """导出渲染缓存
+    
+    按键保存已重采样压缩的图片数据和整理好的OCR文字块，键由内容哈希、
+    OCR状态和导出参数组成，内容或参数变化后自然失效。再次导出时未改动的
+    题目直接读取缓存，耗时只与改动的题目数量相关。多个导出进程可共用同一目录。
+    """
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def entry_path(self, key, ext):
+        """缓存文件路径（按键前两位分目录）"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}{ext}")
+    
+    def read(self, key, ext):
+        """读取缓存文件，不存在时返回None；命中时更新修改时间供淘汰使用"""
+        path = self.entry_path(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+    
+    def write(self, key, ext, data):
+        """原子写入缓存文件"""
+        path = self.entry_path(key, ext)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, path)
+        except OSError as e:
+            print(f"写入渲染缓存失败: {e}")
+    
+    def get_image(self, key):
+        """返回缓存的图片数据；True表示直接嵌入原文件；未命中返回None"""
+        if os.path.exists(self.entry_path(key, ".src")):
+            return True
+        return self.read(key, ".jpg")
+    
+    def put_image(self, key, image_data):
+        """缓存图片数据（原文件路径只记录直接嵌入标记）"""
+        if isinstance(image_data, str):
+            self.write(key, ".src", b"")
+        else:
+            self.write(key, ".jpg", image_data)
+    
+    def get_blocks(self, key):
+        """返回缓存的OCR文字块，未命中返回None"""
+        data = self.read(key, ".json")
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+    
+    def put_blocks(self, key, blocks):
+        """缓存OCR文字块"""
+        self.write(key, ".json", json.dumps(blocks, ensure_ascii=False).encode('utf-8'))
+    
+    def prune(self, max_bytes):
+        """总大小超过上限时按最近使用时间淘汰最旧的缓存文件"""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        
+        files.sort()
+        for _, size, path in files:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+# 图片处理规则变化时递增，使旧的渲染缓存失效（2：透明PNG不再直接嵌入）
+RENDER_FORMAT = 2
+
+def render_key(digest, target_width, target_height, profile):
+    """图片渲染缓存键：内容哈希+目标像素尺寸+压缩参数"""
+    color = "g" if profile["grayscale"] else "c"
+    return f"img{digest}_{target_width}x{target_height}_q{profile['jpeg_quality']}{color}{RENDER_FORMAT}"
+
+def ocr_state(image_path):
+    """OCR附属文件的状态标识（大小和修改时间），用于判断OCR文字块缓存是否有效"""
+    stamps = []
+    for path in (f"{os.path.splitext(image_path)[0]}_ocr.txt", get_ocr_words_path(image_path)):
+        try:
+            stat = os.stat(path)
+            stamps.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            stamps.append("-")
+    return hashlib.sha1("|".join(stamps).encode('utf-8')).hexdigest()[:16]
+
+def load_ocr_blocks(image_path, image_size, image_digest=None):
+    """读取图片的OCR文本和词框，词框换算为相对图片宽高的比例[左, 上, 宽, 高, 文字]
+    
+    图片在OCR后被裁剪、旋转或替换过时词框已失效，words为None：按识别时记录的内容哈希
+    与image_digest对比，旧版本没有记录哈希的词框退回按图片尺寸判断。
+    """
+    ocr_file = f"{os.path.splitext(image_path)[0]}_ocr.txt"
+    ocr_text = None
+    if os.path.exists(ocr_file):
+        try:
+            with open(ocr_file, 'r', encoding='utf-8') as f:
+                ocr_text = f.read()
+        except Exception as e:
+            print(f"读取OCR文件失败: {e}")
+    
+    words = load_ocr_words(image_path)
+    if words is not None and "image_digest" in words:
+        if image_digest is None:
+            image_digest = file_sha1(image_path)
+        current = str(words["image_digest"]) == image_digest
+    else:
+        current = words is not None and tuple(int(v) for v in words["image_size"]) == tuple(image_size)
+    
+    blocks = None
+    if current:
+        img_width, img_height = image_size
+        blocks = []
+        for i, text in enumerate(words["text"]):
+            if words["width"][i] <= 0 or words["height"][i] <= 0:
+                continue
+            blocks.append([float(words["left"][i]) / img_width, float(words["top"][i]) / img_height,
+                           float(words["width"][i]) / img_width, float(words["height"][i]) / img_height,
+                           str(text)])
+    return {"ocr_text": ocr_text, "words": blocks}
+
+def prepare_export_image(file_path, image, target_width, target_height, profile):
+    """按目标像素尺寸重采样并压缩图片，返回JPEG数据；无需处理时返回原文件路径"""
+    target_width = max(1, target_width)
+    target_height = max(1, target_height)
+    needs_resize = image.width > target_width or image.height > target_height
+    # 透明的PNG原样嵌入时透明区域在PDF中显示为黑色，需要先铺白底
+    transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    
+    # 尺寸足够小、不透明且无需转灰度时直接嵌入原文件，避免重复有损压缩
+    if not needs_resize and not transparent and not profile["grayscale"] and image.format in ('JPEG', 'PNG'):
+        return file_path
+    
+    # JPEG可在解码时按比例缩小，大幅减少解码耗时
+    target_mode = 'L' if profile["grayscale"] else 'RGB'
+    image.draft(target_mode, (target_width, target_height))
+    
+    # 透明图片铺白底
+    if transparent:
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image)
+    image = image.convert(target_mode)
+    
+    if needs_resize:
+        image = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=profile["jpeg_quality"])
+    return buffer.getvalue()
+
+def volume_path(output_file, index):
+    """分卷文件路径：错题.pdf -> 错题_001.pdf"""
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_{index:03d}{ext}"
+
+def existing_volume_files(output_file):
+    """目标位置已存在的output_file分卷文件（如上次导出留下的 错题_001.pdf）"""
+    base, ext = os.path.splitext(output_file)
+    directory = os.path.dirname(output_file) or "."
+    prefix = os.path.basename(base) + "_"
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith(prefix) and name.endswith(ext)
+                  and len(name) == len(prefix) + 3 + len(ext) and name[len(prefix):len(prefix) + 3].isdigit())
+
+class VolumeSplitter:
+    """导出分卷
+    
+    按页数或字节数上限（0为不限）把一次导出拆成多个文件，每卷写完即保存并释放，
+    内存占用不随导出规模增长。只有一卷时直接写到目标文件；出现第二卷时
+    第一卷改名为 _001，之后依次编号。同名的旧分卷由调用者在导出前确认并删除。
+    """
+    
+    def __init__(self, output_file, max_pages=0, max_bytes=0):
+        self.output_file = output_file
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.files = []
+        self.pages = 0
+        self.bytes = 0
+    
+    def next_path(self):
+        """开始新的一卷，返回其文件路径（上一卷必须已保存）"""
+        if len(self.files) == 1:
+            first_file = volume_path(self.output_file, 1)
+            os.replace(self.files[0], first_file)
+            self.files[0] = first_file
+        
+        path = volume_path(self.output_file, len(self.files) + 1) if self.files else self.output_file
+        self.files.append(path)
+        self.pages = 0
+        self.bytes = 0
+        return path
+    
+    def add(self, pages=0, size=0):
+        """累计当前卷的页数和字节数"""
+        self.pages += pages
+        self.bytes += size
+    
+    def is_full(self):
+        """当前卷是否已达到上限"""
+        return bool((self.max_pages and self.pages >= self.max_pages) or
+                    (self.max_bytes and self.bytes >= self.max_bytes))
+
+class PdfExporter:
+    """PDF导出流水线
+    
+    先按缓存的图片尺寸排版，再由线程池并行解码、缩放、压缩图片，单个写入者
+    按原顺序写入reportlab画布；预读队列有上限，内存占用不随导出规模增长。
+    版面支持每页一题（single）和每页多题的紧凑排版（compact）；可搜索模式下
+    OCR文字作为不可见文字层叠放在图片上，不再追加OCR文本页。
+    同一导出中内容相同的图片只准备和嵌入一次，各页引用同一个图片对象。
+    设置分卷上限时每卷单独保存，reportlab文档不会随导出规模无限增长。
+    提供渲染缓存时，未改动题目的图片数据和OCR文字块直接取自缓存。
+    """
+    
+    def __init__(self, output_file, profile, task=None, workers=None, layout="single", image_info=None,
+                 searchable=False, volume_pages=0, volume_bytes=0, render_cache=None, item_pool=None):
+        self.output_file = output_file
+        self.volumes = VolumeSplitter(output_file, volume_pages, volume_bytes)
+        self.canvas = None
+        self.canvas_file = None
+        self.page_count = 0
+        self.profile = profile
+        self.task = task
+        self.workers = workers or max(2, os.cpu_count() or 2)
+        self.queue_limit = self.workers * 2
+        self.item_pool = item_pool
+        self.layout = layout
+        self.image_info = image_info or ImageInfoCache()
+        self.render_cache = render_cache
+        self.searchable = searchable
+        self.cjk_font = register_cjk_font()
+        self.page_width, self.page_height = A4
+        self.page_dirty = False
+        # 已成功准备过的图片键（内容哈希+目标尺寸），重复图片不再解码压缩
+        self.prepared_keys = set()
+        self.prepared_lock = threading.Lock()
+        # 每个图片键复用同一个图片源，图片只解码和嵌入一次
+        self.image_readers = {}
+    
+    def font_for(self, text, default_font):
+        """纯ASCII文本使用默认字体，否则使用中文字体"""
+        return default_font if text.isascii() else self.cjk_font
+    
+    def check_cancelled(self):
+        """取消检查点"""
+        if self.task is not None:
+            self.task.check_cancelled()
+    
+    def collect_items(self, export_paths):
+        """按导出顺序列出所有待导出文件"""
+        items = []
+        
+        def walk(folder_path):
+            names = os.listdir(folder_path)
+            name_set = set(names)
+            for item in sorted(names):
+                item_path = os.path.join(folder_path, item)
+                if os.path.isdir(item_path):
+                    walk(item_path)
+                elif not is_sidecar_file(item, name_set):
+                    # 题目的OCR文本、元数据随题目导出，不单独成页
+                    items.append(item_path)
+        
+        for path in export_paths:
+            if os.path.isdir(path):
+                walk(path)
+            elif not is_sidecar_file(os.path.basename(path), set(os.listdir(os.path.dirname(path)))):
+                items.append(path)
+        
+        return [path for path in items
+                if path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.txt'))]
+    
+    def plan_layout(self, items):
+        """计算每项在页面上的位置，返回与items一一对应的版面列表"""
+        if self.layout == "compact":
+            return self.plan_compact_layout(items)
+        
+        placements = []
+        for path in items:
+            if path.lower().endswith('.txt'):
+                placements.append({"new_page": True})
+                continue
+            try:
+                img_width, img_height = self.image_info.get_size(path)
+            except Exception as e:
+                print(f"读取图片尺寸失败 {path}: {e}")
+                placements.append(None)
+                continue
+            
+            # 计算图片显示尺寸
+            max_width = self.page_width - 100
+            max_height = self.page_height - 150
+            
+            ratio = min(max_width / img_width, max_height / img_height)
+            width = img_width * ratio
+            height = img_height * ratio
+            placements.append({
+                "new_page": True,
+                "x": (self.page_width - width) / 2,
+                "y": (self.page_height - height) / 2 - 50,
+                "width": width,
+                "height": height,
+                "title_x": 50,
+                "title_y": self.page_height - 50,
+                "title_size": 16
+            })
+        return placements
+    
+    def plan_compact_layout(self, items):
+        """紧凑排版：按图片宽高比做货架式装箱，保持题目顺序，每页放置多道题"""
+        margin = 36
+        gap = 12
+        caption = 14
+        content_width = self.page_width - 2 * margin
+        max_height = (self.page_height - 2 * margin - gap) / 2
+        top = self.page_height - margin
+        
+        placements = []
+        cursor_x = 0
+        shelf_top = top
+        shelf_height = 0
+        page_start = True
+        
+        for path in items:
+            if path.lower().endswith('.txt'):
+                # 文本文件单独成页，之后的图片从新页开始
+                placements.append({"new_page": True})
+                cursor_x, shelf_top, shelf_height, page_start = 0, top, 0, True
+                continue
+            try:
+                img_width, img_height = self.image_info.get_size(path)
+            except Exception as e:
+                print(f"读取图片尺寸失败 {path}: {e}")
+                placements.append(None)
+                continue
+            
+            # 不放大到超过导出DPI下的原始尺寸，且不超过半页高
+            scale = min(72 / self.profile["dpi"], content_width / img_width,
+                        (max_height - caption) / img_height)
+            width = img_width * scale
+            height = img_height * scale
+            
+            # 当前货架放不下时换到下一个货架
+            if cursor_x > 0 and cursor_x + width > content_width:
+                shelf_top -= shelf_height + gap
+                cursor_x, shelf_height = 0, 0
+            
+            # 当前页放不下时换页
+            if shelf_top - (height + caption) < margin:
+                cursor_x, shelf_top, shelf_height, page_start = 0, top, 0, True
+            
+            placements.append({
+                "new_page": page_start,
+                "x": margin + cursor_x,
+                "y": shelf_top - caption - height,
+                "width": width,
+                "height": height,
+                "title_x": margin + cursor_x,
+                "title_y": shelf_top - 10,
+                "title_size": 9
+            })
+            page_start = False
+            cursor_x += width + gap
+            shelf_height = max(shelf_height, height + caption)
+        
+        return placements
+    
+    def run(self, export_paths):
+        """执行导出"""
+        items = self.collect_items(export_paths)
+        placements = self.plan_layout(items)
+        self.image_info.save()
+        
+        self.report_progress(0, len(items))
+        self.open_volume()
+        try:
+            with worker_pool(self.item_pool, self.workers) as pool:
+                pending = deque()
+                written = 0
+                try:
+                    for path, placement in zip(items, placements):
+                        self.check_cancelled()
+                        pending.append(pool.submit(self.prepare_item, path, placement))
+                        # 队列已满时先按顺序写出最早的一项
+                        if len(pending) >= self.queue_limit:
+                            self.write_next(pending.popleft().result())
+                            written += 1
+                            self.report_progress(written, len(items), os.path.basename(items[written - 1]))
+                    
+                    while pending:
+                        self.check_cancelled()
+                        self.write_next(pending.popleft().result())
+                        written += 1
+                        self.report_progress(written, len(items), os.path.basename(items[written - 1]))
+                finally:
+                    for future in pending:
+                        future.cancel()
+            
+            self.close_volume()
+        except BaseException:
+            # 取消或出错时删除未完成的输出文件
+            self.discard_output()
+            raise
+        
+        self.image_info.save()
+        return self.volumes.files
+    
+    def report_progress(self, done, total, message=""):
+        """报告导出进度"""
+        if self.task is not None:
+            self.task.report(done, total, message)
+    
+    def discard_output(self):
+        """删除本次导出写出的全部分卷文件（当前卷可能未保存或只写了一半，文件不存在时忽略）"""
+        self.canvas = None
+        for path in self.volumes.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def open_volume(self):
+        """开始新的一卷"""
+        self.canvas_file = self.volumes.next_path()
+        self.canvas = canvas.Canvas(self.canvas_file, pagesize=A4)
+        self.page_dirty = False
+        # 图片对象不跨文件共享，新卷中的重复图片需要重新准备
+        with self.prepared_lock:
+            self.prepared_keys.clear()
+        self.image_readers.clear()
+    
+    def close_volume(self):
+        """保存并释放当前卷"""
+        if self.page_dirty:
+            self.canvas.showPage()
+        self.page_count += self.canvas.getPageNumber() - 1
+        try:
+            self.canvas.save()
+        finally:
+            self.canvas = None
+    
+    def write_next(self, item):
+        """按顺序写入下一项；需要换页且当前卷已满时先切换到新的一卷"""
+        if item is None:
+            return
+        if item["placement"]["new_page"]:
+            self.volumes.pages = self.canvas.getPageNumber() - (0 if self.page_dirty else 1)
+            if self.volumes.is_full():
+                self.close_volume()
+                self.open_volume()
+        self.write_item(self.canvas, item)
+    
+    def prepare_item(self, file_path, placement):
+        """在工作线程中准备一项导出内容（解码、缩放、压缩、读取文本）"""
+        if placement is None:
+            return None
+        
+        filename = os.path.basename(file_path)
+        try:
+            if file_path.lower().endswith('.txt'):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    return {"kind": "text", "filename": filename, "content": f.read(),
+                            "placement": placement}
+            
+            image_key = self.image_key(file_path, placement)
+            item = {"kind": "image", "filename": filename, "path": file_path, "ocr_text": None,
+                    "text_layer": None, "placement": placement, "image_key": image_key, "image_data": None}
+            with self.prepared_lock:
+                prepared = image_key in self.prepared_keys
+            # 相同图片此前已准备过，写入时直接引用已嵌入的图片对象
+            if not prepared:
+                item["image_data"] = self.load_image(file_path, image_key, placement)
+                with self.prepared_lock:
+                    self.prepared_keys.add(image_key)
+            
+            # OCR文本（可搜索模式生成文字层；紧凑排版不追加OCR文本页）
+            blocks = self.load_blocks(file_path)
+            if self.searchable:
+                item["text_layer"] = self.build_text_layer(placement, blocks)
+            elif self.layout != "compact":
+                item["ocr_text"] = blocks["ocr_text"]
+            return item
+        
+        except Exception as e:
+            print(f"准备导出内容失败 {filename}: {e}")
+            return None
+    
+    def image_key(self, file_path, placement):
+        """按内容哈希、目标像素尺寸和导出参数生成图片键，不同路径下的相同图片得到同一个键"""
+        digest = self.image_info.get_digest(file_path)
+        target_width = max(1, int(round(placement["width"] / 72 * self.profile["dpi"])))
+        target_height = max(1, int(round(placement["height"] / 72 * self.profile["dpi"])))
+        return render_key(digest, target_width, target_height, self.profile)
+    
+    def load_image(self, file_path, image_key, placement):
+        """取得图片数据：优先读取渲染缓存，未命中时重采样压缩并写入缓存"""
+        if self.render_cache is not None:
+            image_data = self.render_cache.get_image(image_key)
+            if image_data is True:
+                return file_path
+            if image_data is not None:
+                return image_data
+        
+        with Image.open(file_path) as image:
+            image_data = self.prepare_image(file_path, image, placement["width"], placement["height"])
+        if self.render_cache is not None:
+            self.render_cache.put_image(image_key, image_data)
+        return image_data
+    
+    def load_blocks(self, file_path):
+        """取得OCR文本和词框：优先读取渲染缓存"""
+        image_size = self.image_info.get_size(file_path)
+        digest = self.image_info.get_digest(file_path)
+        if self.render_cache is None:
+            return load_ocr_blocks(file_path, image_size, digest)
+        
+        key = f"ocr{digest}_{ocr_state(file_path)}"
+        blocks = self.render_cache.get_blocks(key)
+        if blocks is None:
+            blocks = load_ocr_blocks(file_path, image_size, digest)
+            self.render_cache.put_blocks(key, blocks)
+        return blocks
+    
+    def build_text_layer(self, placement, blocks):
+        """把OCR词框换算为页面坐标，返回[(x, y, 宽, 高, 文字)]"""
+        entries = []
+        
+        # 优先使用词级数据
+        if blocks["words"] is not None:
+            for left, top, width, height, text in blocks["words"]:
+                width *= placement["width"]
+                height *= placement["height"]
+                x = placement["x"] + left * placement["width"]
+                y = placement["y"] + placement["height"] - top * placement["height"] - height
+                entries.append((x, y, width, height, text))
+            return entries
+        
+        # 没有词框时把文本按行均匀铺在图片区域上，仍可被搜索
+        lines = [line for line in (blocks["ocr_text"] or "").split('\n') if line.strip()]
+        if lines:
+            line_height = placement["height"] / len(lines)
+            for i, line in enumerate(lines):
+                y = placement["y"] + placement["height"] - (i + 1) * line_height
+                entries.append((placement["x"], y, placement["width"], line_height, line.strip()))
+        return entries
+    
+    def draw_text_layer(self, c, entries):
+        """绘制不可见文字层（文字渲染模式3）"""
+        text_object = c.beginText()
+        text_object.setTextRenderMode(3)
+        for x, y, width, height, text in entries:
+            font_size = max(1.0, height)
+            natural_width = c.stringWidth(text, self.cjk_font, font_size)
+            text_object.setFont(self.cjk_font, font_size)
+            text_object.setHorizScale(100.0 * width / natural_width if natural_width else 100.0)
+            text_object.setTextOrigin(x, y + height * 0.2)
+            text_object.textOut(text)
+        c.drawText(text_object)
+    
+    def prepare_image(self, file_path, image, display_width, display_height):
+        """按绘制尺寸（磅）和导出DPI重采样并压缩图片"""
+        target_width = max(1, int(round(display_width / 72 * self.profile["dpi"])))
+        target_height = max(1, int(round(display_height / 72 * self.profile["dpi"])))
+        return prepare_export_image(file_path, image, target_width, target_height, self.profile)
+    
+    def draw_image(self, c, item, placement):
+        """按图片键绘制图片：原文件按路径、压缩后的数据按图片键各复用一个图片源，
+        reportlab据此只嵌入一次，之后各页引用同一个图片对象"""
+        image_key = item["image_key"]
+        source = self.image_readers.get(image_key)
+        if source is None:
+            image_data = item["image_data"]
+            if image_data is None:
+                # 工作线程按上一卷跳过了准备，在新卷中补做
+                image_data = self.load_image(item["path"], image_key, placement)
+            if isinstance(image_data, str):
+                source = image_data
+                self.volumes.add(size=os.path.getsize(image_data))
+            else:
+                source = ImageReader(io.BytesIO(image_data))
+                self.volumes.add(size=len(image_data))
+            self.image_readers[image_key] = source
+        c.drawImage(source, placement["x"], placement["y"], placement["width"], placement["height"])
+    
+    def new_page(self, c):
+        """结束当前页（当前页有内容时）"""
+        if self.page_dirty:
+            c.showPage()
+            self.page_dirty = False
+    
+    def draw_text_lines(self, c, text, y_position):
+        """逐行绘制文本，超出页面时换页"""
+        font_name = self.font_for(text, "Helvetica")
+        for line in text.split('\n'):
+            if y_position < 50:
+                c.showPage()
+                c.setFont(font_name, 12)
+                y_position = self.page_height - 50
+            
+            c.drawString(50, y_position, line[:100])  # 限制每行长度
+            y_position -= 20
+    
+    def fit_title(self, c, title, font_name, font_size, max_width):
+        """截断标题使其不超过给定宽度"""
+        if c.stringWidth(title, font_name, font_size) <= max_width:
+            return title
+        while title and c.stringWidth(title + "...", font_name, font_size) > max_width:
+            title = title[:-1]
+        return title + "..."
+    
+    def write_item(self, c, item):
+        """写入一项已准备好的内容（只在写入线程中调用）"""
+        if item is None:
+            return
+        
+        placement = item["placement"]
+        if placement["new_page"]:
+            self.new_page(c)
+        
+        if item["kind"] == "text":
+            # 文本文件
+            c.setFont(self.font_for(item["filename"], "Helvetica-Bold"), 16)
+            c.drawString(50, self.page_height - 50, item["filename"])
+            
+            c.setFont(self.font_for(item["content"], "Helvetica"), 12)
+            self.draw_text_lines(c, item["content"], self.page_height - 80)
+            self.volumes.add(size=len(item["content"].encode('utf-8')))
+            self.page_dirty = True
+            self.new_page(c)
+            return
+        
+        # 图片文件：标题和图片
+        title_size = placement["title_size"]
+        title = item["filename"]
+        title_font = self.font_for(title, "Helvetica-Bold")
+        if self.layout == "compact":
+            title = self.fit_title(c, title, title_font, title_size, placement["width"])
+        c.setFont(title_font, title_size)
+        c.drawString(placement["title_x"], placement["title_y"], title)
+        
+        self.draw_image(c, item, placement)
+        self.page_dirty = True
+        
+        # 不可见文字层
+        if item["text_layer"]:
+            self.draw_text_layer(c, item["text_layer"])
+        
+        # 添加OCR文本
+        if item["ocr_text"] is not None:
+            c.showPage()
+            c.setFont(self.font_for(item["ocr_text"], "Helvetica"), 12)
+            c.drawString(50, self.page_height - 50, f"OCR识别结果 - {item['filename']}")
+            self.draw_text_lines(c, item["ocr_text"], self.page_height - 80)
+
+class WordExporter:
+    """Word导出器
+    
+    先按导出顺序列出文件夹标题、图片和文本，再由线程池并行把图片重采样到
+    显示尺寸，单个写入者按原顺序写入文档。版面支持每页一题（single）和
+    表格网格每页多题的紧凑排版（compact）。设置分卷上限时每卷单独保存，
+    python-docx文档不会随导出规模无限增长。提供渲染缓存时与PDF导出共用。
+    """
+    
+    # 紧凑排版：表格列数、每页行数、单元格内图片的最大宽高（英寸）
+    compact_columns = 2
+    compact_rows = 3
+    compact_cell_width = 3.0
+    compact_cell_height = 2.6
+    
+    def __init__(self, output_file, profile=None, task=None, workers=None, layout="single",
+                 volume_pages=0, volume_bytes=0, image_info=None, render_cache=None, item_pool=None):
+        self.output_file = output_file
+        self.profile = profile or EXPORT_PROFILES["standard"]
+        self.task = task
+        self.workers = workers or max(2, os.cpu_count() or 2)
+        self.queue_limit = self.workers * 2
+        self.item_pool = item_pool
+        self.layout = layout
+        self.volumes = VolumeSplitter(output_file, volume_pages, volume_bytes)
+        self.image_info = image_info or ImageInfoCache()
+        self.render_cache = render_cache
+        self.doc = None
+        self.doc_file = None
+        self.table = None
+        self.cell_index = 0
+        self.page_count = 0
+    
+    def check_cancelled(self):
+        """取消检查点"""
+        if self.task is not None:
+            self.task.check_cancelled()
+    
+    def collect_entries(self, export_paths):
+        """按导出顺序列出[(类型, 路径)]，类型为folder或file"""
+        entries = []
+        
+        def walk(folder_path):
+            entries.append(("folder", folder_path))
+            names = os.listdir(folder_path)
+            name_set = set(names)
+            for item in sorted(names):
+                item_path = os.path.join(folder_path, item)
+                if os.path.isdir(item_path):
+                    # 子文件夹
+                    walk(item_path)
+                elif (item_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.txt'))
+                      and not is_sidecar_file(item, name_set)):
+                    entries.append(("file", item_path))
+        
+        for path in export_paths:
+            if os.path.isdir(path):
+                walk(path)
+            elif (path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.txt'))
+                  and not is_sidecar_file(os.path.basename(path), set(os.listdir(os.path.dirname(path))))):
+                entries.append(("file", path))
+        return entries
+    
+    def run(self, export_paths):
+        """执行导出，返回生成的文件列表"""
+        entries = self.collect_entries(export_paths)
+        
+        self.report_progress(0, len(entries))
+        self.open_volume()
+        try:
+            with worker_pool(self.item_pool, self.workers) as pool:
+                pending = deque()
+                written = 0
+                try:
+                    for entry in entries:
+                        self.check_cancelled()
+                        pending.append(pool.submit(self.prepare_entry, *entry))
+                        # 队列已满时先按顺序写出最早的一项
+                        if len(pending) >= self.queue_limit:
+                            self.write_entry(pending.popleft().result())
+                            written += 1
+                            self.report_progress(written, len(entries), os.path.basename(entries[written - 1][1]))
+                    
+                    while pending:
+                        self.check_cancelled()
+                        self.write_entry(pending.popleft().result())
+                        written += 1
+                        self.report_progress(written, len(entries), os.path.basename(entries[written - 1][1]))
+                finally:
+                    for future in pending:
+                        future.cancel()
+            
+            self.close_volume()
+        except BaseException:
+            # 取消或出错时删除未完成的输出文件
+            self.discard_output()
+            raise
+        
+        self.image_info.save()
+        return self.volumes.files
+    
+    def report_progress(self, done, total, message=""):
+        """报告导出进度"""
+        if self.task is not None:
+            self.task.report(done, total, message)
+    
+    def discard_output(self):
+        """删除本次导出写出的全部分卷文件（当前卷可能未保存或只写了一半，文件不存在时忽略）"""
+        self.doc = None
+        for path in self.volumes.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def open_volume(self):
+        """开始新的一卷"""
+        self.doc_file = self.volumes.next_path()
+        self.doc = Document()
+        self.table = None
+        self.cell_index = 0
+    
+    def close_volume(self):
+        """保存并释放当前卷"""
+        try:
+            self.doc.save(self.doc_file)
+        finally:
+            self.doc = None
+            self.table = None
+    
+    def start_page(self):
+        """写入新的一页之前，当前卷已满时切换到新的一卷"""
+        if self.volumes.is_full():
+            self.close_volume()
+            self.open_volume()
+    
+    def display_size(self, image_size):
+        """图片在文档中的显示尺寸（英寸）"""
+        img_width, img_height = image_size
+        if self.layout != "compact":
+            return 6.0, 6.0 * img_height / img_width
+        scale = min(self.compact_cell_width / img_width, self.compact_cell_height / img_height)
+        return img_width * scale, img_height * scale
+    
+    def prepare_entry(self, kind, path):
+        """在工作线程中准备一项导出内容（重采样图片、读取文本）"""
+        filename = os.path.basename(path)
+        if kind == "folder":
+            return {"kind": "folder", "filename": filename}
+        
+        try:
+            if path.lower().endswith('.txt'):
+                # 文本文件
+                with open(path, 'r', encoding='utf-8') as f:
+                    return {"kind": "text", "filename": filename, "content": f.read()}
+            
+            # 图片文件：按显示尺寸和导出DPI重采样，优先读取渲染缓存
+            display_width, display_height = self.display_size(self.image_info.get_size(path))
+            target_width = max(1, int(round(display_width * self.profile["dpi"])))
+            target_height = max(1, int(round(display_height * self.profile["dpi"])))
+            image_data = None
+            if self.render_cache is not None:
+                image_key = render_key(self.image_info.get_digest(path), target_width, target_height, self.profile)
+                image_data = self.render_cache.get_image(image_key)
+                if image_data is True:
+                    image_data = path
+            if image_data is None:
+                with Image.open(path) as image:
+                    image_data = prepare_export_image(path, image, target_width, target_height, self.profile)
+                if self.render_cache is not None:
+                    self.render_cache.put_image(image_key, image_data)
+            
+            # 检查是否有OCR文本（紧凑排版不附带OCR文本）
+            ocr_text = None
+            ocr_file = f"{os.path.splitext(path)[0]}_ocr.txt"
+            if self.layout != "compact" and os.path.exists(ocr_file):
+                try:
+                    with open(ocr_file, 'r', encoding='utf-8') as f:
+                        ocr_text = f.read()
+                except Exception as e:
+                    print(f"读取OCR文件失败: {e}")
+            
+            return {"kind": "image", "filename": filename, "image_data": image_data,
+                    "width": display_width, "height": display_height, "ocr_text": ocr_text}
+        
+        except Exception as e:
+            print(f"准备导出内容失败 {filename}: {e}")
+            return None
+    
+    def write_entry(self, entry):
+        """写入一项已准备好的内容（只在写入线程中调用）"""
+        if entry is None:
+            return
+        
+        if entry["kind"] == "folder":
+            self.table = None
+            self.doc.add_heading(f'文件夹: {entry["filename"]}', level=1)
+            return
+        
+        if entry["kind"] == "text":
+            # 文本文件单独成页
+            self.table = None
+            self.start_page()
+            self.doc.add_heading(entry["filename"], level=2)
+            self.doc.add_paragraph(entry["content"])
+            self.doc.add_page_break()
+            self.volumes.add(pages=1, size=len(entry["content"].encode('utf-8')))
+            self.page_count += 1
+            return
+        
+        image_data = entry["image_data"]
+        # python-docx按内容SHA1复用图片部件，重复图片只存一份
+        image_source = image_data if isinstance(image_data, str) else io.BytesIO(image_data)
+        image_bytes = os.path.getsize(image_data) if isinstance(image_data, str) else len(image_data)
+        
+        try:
+            if self.layout == "compact":
+                self.write_cell(entry, image_source)
+            else:
+                self.start_page()
+                doc = self.doc
+                doc.add_heading(entry["filename"], level=2)
+                doc.add_picture(image_source, width=Inches(entry["width"]))
+                
+                # 添加OCR文本
+                if entry["ocr_text"] is not None:
+                    doc.add_heading('OCR识别结果', level=3)
+                    doc.add_paragraph(entry["ocr_text"])
+                
+                doc.add_page_break()
+                self.volumes.add(pages=1)
+                self.page_count += 1
+            self.volumes.add(size=image_bytes)
+        except Exception as e:
+            print(f"导出图片失败: {e}")
+    
+    def write_cell(self, entry, image_source):
+        """紧凑排版：把图片写入表格网格的下一个单元格"""
+        per_page = self.compact_columns * self.compact_rows
+        if self.table is None or self.cell_index % per_page == 0:
+            # 新的一页
+            if self.table is not None:
+                self.doc.add_page_break()
+            self.start_page()
+            self.table = self.doc.add_table(rows=0, cols=self.compact_columns)
+            self.cell_index = 0
+            self.volumes.add(pages=1)
+            self.page_count += 1
+        
+        if self.cell_index % self.compact_columns == 0:
+            self.table.add_row()
+        cell = self.table.rows[-1].cells[self.cell_index % self.compact_columns]
+        self.cell_index += 1
+        
+        title_run = cell.paragraphs[0].add_run(entry["filename"])
+        title_run.bold = True
+        title_run.font.size = Pt(9)
+        cell.add_paragraph().add_run().add_picture(image_source, width=Inches(entry["width"]))
+
+def export_document(source_path, output_file, profile, layout, searchable, volume_pages, volume_bytes, workers,
+                    render_cache_dir=None, cancel_event=None):
+    """在子进程中把一个文件夹导出为独立的PDF，返回页数、大小和耗时
+    
+    cancel_event置位后导出在下一个检查点停止，并删除本文档未完成的输出文件。
+    """
+    start_time = time.perf_counter()
+    render_cache = RenderCache(render_cache_dir) if render_cache_dir else None
+    task = ProcessCancelToken(source_path, cancel_event) if cancel_event is not None else None
+    exporter = PdfExporter(output_file, profile, task=task, workers=workers, layout=layout, searchable=searchable,
+                           volume_pages=volume_pages, volume_bytes=volume_bytes, render_cache=render_cache)
+    files = exporter.run([source_path])
+    return {
+        "name": os.path.basename(source_path),
+        "source": source_path,
+        "files": files,
+        "pages": exporter.page_count,
+        "bytes": sum(os.path.getsize(f) for f in files),
+        "seconds": round(time.perf_counter() - start_time, 2)
+    }
+
+class ObjectStore:
+    """内容寻址的文件仓库：文件内容按SHA256存入objects/，相同内容只存一份"""
+    
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.objects_dir = os.path.join(root_dir, "objects")
+        self.temp_dir = os.path.join(root_dir, "tmp")
+        for path in (self.objects_dir, self.temp_dir):
+            os.makedirs(path, exist_ok=True)
+    
+    def object_path(self, digest):
+        """对象文件路径（按哈希前两位分目录）"""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+    
+    def store_file(self, path):
+        """把文件写入仓库并返回其SHA256；一次读取同时完成哈希和复制，返回(哈希, 是否新对象, 字节数)"""
+        digest = hashlib.sha256()
+        temp_file = os.path.join(self.temp_dir, f"{os.getpid()}_{threading.get_ident()}.tmp")
+        size = 0
+        try:
+            with open(path, 'rb') as src, open(temp_file, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        digest = digest.hexdigest()
+        
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            os.remove(temp_file)
+            return digest, False, size
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(temp_file, object_path)
+        return digest, True, size
+
+class BackupStore(ObjectStore):
+    """增量备份仓库
+    
+    每次备份在snapshots/下写一份清单，记录相对路径到哈希、大小和修改时间的映射。
+    大小和修改时间与上一次快照相同的文件直接沿用其哈希，不再读取；
+    其余文件由线程池并行边读取边计算哈希，只有仓库中不存在的内容才会写入。
+    """
+    
+    def __init__(self, backup_dir):
+        super().__init__(backup_dir)
+        self.snapshots_dir = os.path.join(backup_dir, "snapshots")
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+    
+    def list_snapshots(self):
+        """按时间顺序列出快照名称"""
+        return sorted(name[:-5] for name in os.listdir(self.snapshots_dir) if name.endswith(".json"))
+    
+    def load_snapshot(self, name):
+        """读取快照清单"""
+        with open(os.path.join(self.snapshots_dir, f"{name}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def verify(self, names=None, task=None, workers=None, item_pool=None):
+        """并行重新计算快照引用的所有对象的哈希，返回{"checked", "missing", "corrupt"}（后两者为相对路径列表）"""
+        paths_by_digest = {}
+        for name in names or self.list_snapshots():
+            for rel_path, entry in self.load_snapshot(name)["files"].items():
+                paths_by_digest.setdefault(entry[0], []).append(rel_path)
+        
+        def check(digest):
+            object_path = self.object_path(digest)
+            if not os.path.exists(object_path):
+                return "missing"
+            return "ok" if file_sha256(object_path) == digest else "corrupt"
+        
+        result = {"checked": len(paths_by_digest), "missing": [], "corrupt": []}
+        if task is not None:
+            task.report(0, len(paths_by_digest), "")
+        with worker_pool(item_pool, workers or min(8, (os.cpu_count() or 2) * 2)) as pool:
+            futures = {pool.submit(check, digest): digest for digest in paths_by_digest}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    if task is not None:
+                        task.check_cancelled()
+                    status = future.result()
+                    if status != "ok":
+                        result[status].extend(sorted(set(paths_by_digest[futures[future]])))
+                    if task is not None:
+                        task.report(done, len(futures), "")
+            finally:
+                for future in futures:
+                    future.cancel()
+        return result
+    
+    def restore(self, name, target_dir, selection=None, task=None, workers=None, item_pool=None):
+        """把快照恢复到target_dir，只复制与当前文件不同的文件
+        
+        selection为相对路径列表（学科目录或题目文件），None表示整个快照；
+        快照中没有的现有文件保持不动。复制时同时校验对象内容，缺失或损坏的对象
+        不覆盖现有文件，记入corrupt。返回{"restored", "unchanged", "corrupt"}。
+        """
+        snapshot = self.load_snapshot(name)
+        
+        def selected(rel_path):
+            if selection is None:
+                return True
+            return any(rel_path == path or rel_path.startswith(path.rstrip("/") + "/") for path in selection)
+        
+        for rel_dir in snapshot.get("dirs", []):
+            if selected(rel_dir):
+                os.makedirs(os.path.join(target_dir, *rel_dir.split("/")), exist_ok=True)
+        
+        def restore_file(rel_path, entry):
+            digest, size, mtime_ns = entry
+            target = os.path.join(target_dir, *rel_path.split("/"))
+            if os.path.exists(target):
+                stat = os.stat(target)
+                if stat.st_size == size and (stat.st_mtime_ns == mtime_ns or file_sha256(target) == digest):
+                    return False
+            object_path = self.object_path(digest)
+            if not os.path.exists(object_path):
+                return None
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_file = target + ".restoring"
+            # 一次读取同时完成复制和哈希校验
+            content_digest = hashlib.sha256()
+            try:
+                with open(object_path, 'rb') as src, open(temp_file, 'wb') as dst:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        content_digest.update(chunk)
+                        dst.write(chunk)
+                if content_digest.hexdigest() != digest:
+                    os.remove(temp_file)
+                    return None
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+            os.utime(temp_file, ns=(mtime_ns, mtime_ns))
+            os.replace(temp_file, target)
+            return True
+        
+        items = [(rel_path, entry) for rel_path, entry in snapshot["files"].items() if selected(rel_path)]
+        result = {"restored": 0, "unchanged": 0, "corrupt": []}
+        if task is not None:
+            task.report(0, len(items), "")
+        with worker_pool(item_pool, workers or min(8, (os.cpu_count() or 2) * 2)) as pool:
+            futures = {pool.submit(restore_file, *item): item[0] for item in items}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    if task is not None:
+                        task.check_cancelled()
+                    restored = future.result()
+                    if restored is None:
+                        result["corrupt"].append(futures[future])
+                    else:
+                        result["restored" if restored else "unchanged"] += 1
+                    if task is not None:
+                        task.report(done, len(futures), os.path.basename(futures[future]))
+            finally:
+                for future in futures:
+                    future.cancel()
+        return result
+    
+    def create_snapshot(self, source_dir, task=None, workers=None, item_pool=None):
+        """为source_dir创建增量快照，返回快照摘要"""
+        start_time = time.perf_counter()
+        
+        # 上一次快照用于跳过未变化文件的哈希计算
+        previous = {}
+        snapshots = self.list_snapshots()
+        if snapshots:
+            try:
+                previous = self.load_snapshot(snapshots[-1])["files"]
+            except Exception as e:
+                print(f"读取上一次快照失败: {e}")
+        
+        files = {}
+        dirs = []
+        to_store = []
+        for root, dir_names, file_names in os.walk(source_dir):
+            dir_names.sort()
+            rel_root = os.path.relpath(root, source_dir)
+            if rel_root != ".":
+                dirs.append(rel_root.replace(os.sep, "/"))
+            for name in sorted(file_names):
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, source_dir).replace(os.sep, "/")
+                stat = os.stat(path)
+                entry = previous.get(rel_path)
+                if (entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns
+                        and os.path.exists(self.object_path(entry[0]))):
+                    files[rel_path] = entry
+                else:
+                    to_store.append((rel_path, path, stat))
+        
+        new_objects = 0
+        new_bytes = 0
+        if task is not None:
+            task.report(0, len(to_store), "")
+        with worker_pool(item_pool, workers or min(8, (os.cpu_count() or 2) * 2)) as pool:
+            futures = {pool.submit(self.store_file, path): (rel_path, stat) for rel_path, path, stat in to_store}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    if task is not None:
+                        task.check_cancelled()
+                    rel_path, stat = futures[future]
+                    digest, is_new, size = future.result()
+                    files[rel_path] = [digest, stat.st_size, stat.st_mtime_ns]
+                    if is_new:
+                        new_objects += 1
+                        new_bytes += size
+                    if task is not None:
+                        task.report(done, len(to_store), os.path.basename(rel_path))
+            finally:
+                for future in futures:
+                    future.cancel()
+        
+        name = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        if os.path.exists(os.path.join(self.snapshots_dir, f"{name}.json")):
+            name = f"{name}_{len(snapshots) + 1}"
+        snapshot = {
+            "created_time": datetime.datetime.now().isoformat(),
+            "source": source_dir,
+            "files": dict(sorted(files.items())),
+            "dirs": dirs
+        }
+        temp_file = os.path.join(self.temp_dir, f"{name}.json")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(temp_file, os.path.join(self.snapshots_dir, f"{name}.json"))
+        
+        return {
+            "name": name,
+            "files": len(files),
+            "total_bytes": sum(entry[1] for entry in files.values()),
+            "new_objects": new_objects,
+            "new_bytes": new_bytes,
+            "seconds": round(time.perf_counter() - start_time, 2)
+        }
+
+# 压缩备份中原样存储的文件类型（本身已压缩，再压缩只浪费CPU）
+ARCHIVE_STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.npz', '.zip', '.pdf', '.docx')
+
+def plan_archive_volumes(source_dir, volume_bytes=0):
+    """列出要归档的文件并按原始大小分卷，返回[[(路径, 归档内路径), ...], ...]"""
+    volumes = [[]]
+    volume_size = 0
+    for root, dir_names, file_names in os.walk(source_dir):
+        dir_names.sort()
+        for name in sorted(file_names):
+            path = os.path.join(root, name)
+            arcname = os.path.relpath(path, os.path.dirname(source_dir)).replace(os.sep, "/")
+            size = os.path.getsize(path)
+            # 当前卷放不下时开始新卷（单个大文件独占一卷）
+            if volume_bytes and volumes[-1] and volume_size + size > volume_bytes:
+                volumes.append([])
+                volume_size = 0
+            volumes[-1].append((path, arcname))
+            volume_size += size
+    return volumes
+
+# 不超过此大小的文件由工作线程整体预读并计算校验和，更大的文件在写入时流式处理
+ARCHIVE_PREFETCH_BYTES = 32 * 1024 * 1024
+
+def read_archive_member(path):
+    """读取要归档的文件并计算SHA256（在工作线程中执行），返回(内容, 哈希)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+def write_archive_volume(output_file, files, progress=None, pool=None, queue_limit=8):
+    """把文件流式写入一个zip分卷：图片等已压缩的文件原样存储，文本和元数据压缩存储
+    
+    写入时同时计算SHA256，最后在卷内写入校验清单manifest.json。提供线程池时，
+    较小的文件由工作线程预读并计算哈希（预读队列有上限），单个写入者按顺序写入。
+    """
+    manifest = {}
+    pending = deque()
+    next_index = 0
+    
+    def prefetch():
+        # 保持预读队列填满；大文件不预读，写入时再流式读取
+        nonlocal next_index
+        while next_index < len(files) and len(pending) < queue_limit:
+            path = files[next_index][0]
+            if pool is not None and os.path.getsize(path) <= ARCHIVE_PREFETCH_BYTES:
+                pending.append(pool.submit(read_archive_member, path))
+            else:
+                pending.append(None)
+            next_index += 1
+    
+    with zipfile.ZipFile(output_file, 'w', allowZip64=True) as archive:
+        try:
+            for path, arcname in files:
+                prefetch()
+                future = pending.popleft()
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                if path.lower().endswith(ARCHIVE_STORED_EXTENSIONS):
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                
+                if future is not None:
+                    data, digest = future.result()
+                    info.file_size = len(data)
+                    with archive.open(info, 'w') as dst:
+                        dst.write(data)
+                else:
+                    digest = hashlib.sha256()
+                    with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+                        for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                            digest.update(chunk)
+                            dst.write(chunk)
+                    digest = digest.hexdigest()
+                manifest[arcname] = [digest, info.file_size]
+                if progress is not None:
+                    progress(arcname)
+        finally:
+            for future in pending:
+                if future is not None:
+                    future.cancel()
+        
+        archive.writestr("manifest.json", json.dumps({
+            "created_time": datetime.datetime.now().isoformat(),
+            "files": manifest
+        }, ensure_ascii=False), compress_type=zipfile.ZIP_DEFLATED)
+
+def verify_archive_volume(archive_file):
+    """按卷内校验清单逐个校验zip分卷中的文件，返回(校验数, 缺失列表, 损坏列表)"""
+    missing = []
+    corrupt = []
+    with zipfile.ZipFile(archive_file) as archive:
+        manifest = json.loads(archive.read("manifest.json").decode('utf-8'))["files"]
+        names = set(archive.namelist())
+        for arcname, (expected, size) in manifest.items():
+            if arcname not in names:
+                missing.append(arcname)
+                continue
+            digest = hashlib.sha256()
+            try:
+                with archive.open(arcname) as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            except (zipfile.BadZipFile, zlib.error, OSError):
+                corrupt.append(arcname)
+                continue
+            if digest.hexdigest() != expected:
+                corrupt.append(arcname)
+    return len(manifest), missing, corrupt
+
+def create_backup_archive(source_dir, output_file, volume_bytes=0, task=None, workers=None, item_pool=None):
+    """把source_dir流式打包为zip压缩备份，可按大小分卷；各分卷是独立的zip
+    
+    分卷依次写出，卷内文件由线程池并行读取和计算校验和，不分卷时同样使用多个核心。
+    """
+    start_time = time.perf_counter()
+    volumes = plan_archive_volumes(source_dir, volume_bytes)
+    if len(volumes) == 1:
+        output_files = [output_file]
+    else:
+        output_files = [volume_path(output_file, i + 1) for i in range(len(volumes))]
+    
+    total = sum(len(files) for files in volumes)
+    done = [0]
+    lock = threading.Lock()
+    
+    def progress(arcname):
+        # 每写入一个文件调用：检查取消并汇总进度
+        if task is not None:
+            task.check_cancelled()
+            with lock:
+                done[0] += 1
+                task.report(done[0], total, os.path.basename(arcname))
+    
+    if task is not None:
+        task.report(0, total, "")
+    try:
+        workers = workers or max(2, os.cpu_count() or 2)
+        with worker_pool(item_pool, workers) as pool:
+            for path, files in zip(output_files, volumes):
+                write_archive_volume(path, files, progress, pool, queue_limit=workers * 2)
+    except BaseException:
+        # 取消或出错时删除未完成的压缩包
+        for path in output_files:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    
+    return {
+        "files": output_files,
+        "count": total,
+        "bytes": sum(os.path.getsize(path) for path in output_files),
+        "seconds": round(time.perf_counter() - start_time, 2)
+    }
+
+class VersionStore(ObjectStore):
+    """题目编辑历史
+    
+    预处理、裁剪、旋转覆盖图片之前把当前内容存为一个版本，保存在错题目录之外，
+    内容相同的版本只存一份。versions/下每道题一个JSON，按题目相对路径索引其版本列表。
+    """
+    
+    def __init__(self, history_dir, library_dir):
+        super().__init__(history_dir)
+        self.library_dir = library_dir
+        self.versions_dir = os.path.join(history_dir, "versions")
+        os.makedirs(self.versions_dir, exist_ok=True)
+        # 保存版本与清理对象互斥，避免刚写入的对象在登记前被当作无用对象删除
+        self.lock = threading.Lock()
+    
+    def relative_path(self, image_path):
+        """题目相对错题目录的路径"""
+        return os.path.relpath(image_path, self.library_dir).replace(os.sep, "/")
+    
+    def index_path(self, rel_path):
+        """题目版本列表文件路径"""
+        return os.path.join(self.versions_dir, hashlib.sha1(rel_path.encode('utf-8')).hexdigest() + ".json")
+    
+    def read_index(self, index_path):
+        """读取版本列表文件，返回(相对路径, 版本列表)"""
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data["path"], data["versions"]
+        except (OSError, ValueError, KeyError):
+            return None, []
+    
+    def write_index(self, rel_path, versions):
+        """原子写入版本列表，没有版本时删除列表文件"""
+        index_path = self.index_path(rel_path)
+        if not versions:
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            return
+        temp_file = index_path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"path": rel_path, "versions": versions}, f, ensure_ascii=False)
+        os.replace(temp_file, index_path)
+    
+    def list_versions(self, image_path):
+        """按时间顺序列出题目的版本[{"digest", "time", "action", "size"}]"""
+        return self.read_index(self.index_path(self.relative_path(image_path)))[1]
+    
+    def save_version(self, image_path, action, source_path=None, timestamp=None):
+        """把题目当前内容（或source_path的内容）存为新版本，与最新版本相同时跳过"""
+        rel_path = self.relative_path(image_path)
+        with self.lock:
+            digest, _, size = self.store_file(source_path or image_path)
+            versions = self.list_versions(image_path)
+            if versions and versions[-1]["digest"] == digest:
+                return
+            versions.append({
+                "digest": digest,
+                "time": (timestamp or datetime.datetime.now()).isoformat(timespec="seconds"),
+                "action": action,
+                "size": size
+            })
+            versions.sort(key=lambda version: version["time"])
+            self.write_index(rel_path, versions)
+    
+    def restore_version(self, image_path, index):
+        """把题目恢复为指定版本，恢复前的内容也存为一个版本"""
+        version = self.list_versions(image_path)[index]
+        if os.path.exists(image_path):
+            self.save_version(image_path, "恢复前")
+        temp_file = image_path + ".restoring"
+        shutil.copyfile(self.object_path(version["digest"]), temp_file)
+        os.replace(temp_file, image_path)
+    
+    def move_history(self, moves):
+        """题目或文件夹改名、移动后把版本列表转到新路径下，moves为[(旧路径, 新路径)]"""
+        renamed = {}
+        for old_path, new_path in moves:
+            old_rel, new_rel = self.relative_path(old_path), self.relative_path(new_path)
+            # 移出错题目录的题目不再跟踪
+            if not old_rel.startswith("../") and not new_rel.startswith("../"):
+                renamed[old_rel] = new_rel
+        if not renamed:
+            return
+        
+        with self.lock:
+            # 先读出全部受影响的列表再写入，互换名字时不会互相覆盖
+            updates = []
+            for name in os.listdir(self.versions_dir):
+                if not name.endswith(".json"):
+                    continue
+                rel_path, versions = self.read_index(os.path.join(self.versions_dir, name))
+                if rel_path is None:
+                    continue
+                prefix = rel_path
+                while prefix and prefix not in renamed:
+                    prefix = prefix.rpartition("/")[0]
+                if prefix:
+                    updates.append((rel_path, renamed[prefix] + rel_path[len(prefix):], versions))
+            for rel_path, _, _ in updates:
+                self.write_index(rel_path, [])
+            for _, new_rel, versions in updates:
+                self.write_index(new_rel, versions)
+
+    def migrate_backups(self):
+        """把旧版本留在题目旁边的 <图片>.backup 文件导入历史并删除，返回导入数量"""
+        migrated = 0
+        for root, _, file_names in os.walk(self.library_dir):
+            for name in file_names:
+                if not name.endswith(".backup"):
+                    continue
+                backup_path = os.path.join(root, name)
+                try:
+                    timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(backup_path))
+                    self.save_version(backup_path[:-len(".backup")], "原图", backup_path, timestamp)
+                    os.remove(backup_path)
+                    migrated += 1
+                except Exception as e:
+                    print(f"导入旧备份失败 {backup_path}: {e}")
+        return migrated
+    
+    def prune(self, keep_last, keep_days):
+        """按保留策略清理版本：保留每题最近keep_last个以及keep_days天内的版本，并删除不再引用的对象"""
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=keep_days)).isoformat(timespec="seconds")
+        removed_versions = 0
+        removed_objects = 0
+        
+        with self.lock:
+            referenced = set()
+            for name in os.listdir(self.versions_dir):
+                if not name.endswith(".json"):
+                    continue
+                rel_path, versions = self.read_index(os.path.join(self.versions_dir, name))
+                if rel_path is None:
+                    continue
+                kept = [version for i, version in enumerate(versions)
+                        if i >= len(versions) - keep_last or version["time"] >= cutoff]
+                if len(kept) != len(versions):
+                    removed_versions += len(versions) - len(kept)
+                    self.write_index(rel_path, kept)
+                referenced.update(version["digest"] for version in kept)
+            
+            for root, _, file_names in os.walk(self.objects_dir):
+                for name in file_names:
+                    if name not in referenced:
+                        os.remove(os.path.join(root, name))
+                        removed_objects += 1
+        
+        return removed_versions, removed_objects
+
+class TrashStore:
+    """回收站
+    
+    删除只是把题目（连同附属文件）或文件夹重命名进回收站目录，与错题目录在同一文件系统上，
+    无论文件夹多大都是常数时间。每条删除记录一个目录 <编号>/ 和一个 <编号>.json（原路径、时间、大小），
+    彻底删除由后台按保留天数和总大小清理。
+    """
+    
+    def __init__(self, trash_dir, library_dir):
+        self.trash_dir = trash_dir
+        self.library_dir = library_dir
+        os.makedirs(trash_dir, exist_ok=True)
+        # 删除、还原与清理互斥，避免清理到正在写入的记录
+        self.lock = threading.Lock()
+    
+    def entry_path(self, entry_id):
+        """删除记录文件路径"""
+        return os.path.join(self.trash_dir, f"{entry_id}.json")
+    
+    def write_entry(self, entry):
+        """原子写入删除记录"""
+        temp_file = self.entry_path(entry["id"]) + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_file, self.entry_path(entry["id"]))
+    
+    def move_to_trash(self, path):
+        """把文件夹或题目（含附属文件）移入回收站，返回删除记录"""
+        if os.path.isdir(path):
+            paths = [path]
+        else:
+            paths = [file_path for file_path in question_files(path) if os.path.exists(file_path)]
+            if not paths:
+                raise FileNotFoundError(path)
+        
+        with self.lock:
+            entry_id = f"{time.time_ns():x}"
+            entry_dir = os.path.join(self.trash_dir, entry_id)
+            os.makedirs(entry_dir)
+            moved = []
+            try:
+                for file_path in paths:
+                    target = os.path.join(entry_dir, os.path.basename(file_path))
+                    try:
+                        os.rename(file_path, target)
+                    except OSError:
+                        # 不在同一文件系统（如错题目录是链接）时退化为复制后删除
+                        shutil.move(file_path, target)
+                    moved.append(file_path)
+            except BaseException:
+                for file_path in moved:
+                    shutil.move(os.path.join(entry_dir, os.path.basename(file_path)), file_path)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                raise
+            
+            entry = {
+                "id": entry_id,
+                "path": os.path.relpath(path, self.library_dir).replace(os.sep, "/"),
+                "names": [os.path.basename(file_path) for file_path in paths],
+                "is_dir": os.path.isdir(os.path.join(entry_dir, os.path.basename(path))),
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "size": None
+            }
+            self.write_entry(entry)
+            return entry
+    
+    def list_entries(self):
+        """按删除时间顺序列出删除记录"""
+        entries = []
+        for name in os.listdir(self.trash_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.trash_dir, name), 'r', encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"读取回收站记录失败 {name}: {e}")
+        entries.sort(key=lambda entry: (entry["time"], entry["id"]))
+        return entries
+    
+    def entry_size(self, entry):
+        """删除内容的总字节数，首次计算后记入记录"""
+        if entry.get("size") is not None:
+            return entry["size"]
+        size = 0
+        for root, _, file_names in os.walk(os.path.join(self.trash_dir, entry["id"])):
+            for name in file_names:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        entry["size"] = size
+        with self.lock:
+            # 统计期间记录已被还原或删除时不再写回
+            if os.path.exists(self.entry_path(entry["id"])):
+                self.write_entry(entry)
+        return size
+    
+    def restore(self, entry_id):
+        """把删除的内容移回原位置，原位置已有同名文件时自动改名，返回还原后的路径"""
+        with self.lock:
+            with open(self.entry_path(entry_id), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            entry_dir = os.path.join(self.trash_dir, entry_id)
+            target_path = os.path.join(self.library_dir, *entry["path"].split("/"))
+            target_dir = os.path.dirname(target_path)
+            os.makedirs(target_dir, exist_ok=True)
+            
+            # 题目和附属文件一起改名，保证仍能对应
+            base, ext = os.path.splitext(os.path.basename(target_path))
+            suffix = ""
+            counter = 1
+            while any(os.path.exists(os.path.join(target_dir, name.replace(base, base + suffix, 1)))
+                      for name in entry["names"]):
+                suffix = f"_restored{counter}"
+                counter += 1
+            
+            for name in entry["names"]:
+                os.rename(os.path.join(entry_dir, name),
+                          os.path.join(target_dir, name.replace(base, base + suffix, 1)))
+            os.remove(self.entry_path(entry_id))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return os.path.join(target_dir, base + suffix + ext)
+    
+    def remove_entry(self, entry_id):
+        """彻底删除一条记录：先删记录再删内容，中途中断只会留下无记录的目录，下次清理时删除
+        
+        锁内只删除记录文件，内容在锁外删除，不阻塞同时进行的删除和还原。
+        """
+        with self.lock:
+            json_path = self.entry_path(entry_id)
+            if os.path.exists(json_path):
+                os.remove(json_path)
+        shutil.rmtree(os.path.join(self.trash_dir, entry_id), ignore_errors=True)
+    
+    def purge(self, keep_days=None, max_bytes=None, task=None):
+        """按保留策略彻底删除：超过keep_days天的记录，以及总大小超过max_bytes时最早的记录；
+        两者都为None时清空回收站。返回(删除记录数, 释放字节数)"""
+        cutoff = None
+        if keep_days is not None:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=keep_days)).isoformat(timespec="seconds")
+        purge_all = keep_days is None and max_bytes is None
+        
+        # 统计大小需要遍历目录，不持有锁，清理期间删除和还原不受影响
+        sizes = {}
+        for entry in self.list_entries():
+            if task:
+                task.check_cancelled()
+            sizes[entry["id"]] = self.entry_size(entry)
+        
+        # 锁内只选出要删除的记录并删掉记录文件，被选中的内容从此不可还原
+        doomed = []
+        with self.lock:
+            current = self.list_entries()
+            known = {entry["id"] for entry in current}
+            # 统计之后新删除的记录留到下次清理
+            entries = [entry for entry in current if entry["id"] in sizes]
+            # 没有记录的残留目录（上次彻底删除中断）一并删除
+            for name in os.listdir(self.trash_dir):
+                if os.path.isdir(os.path.join(self.trash_dir, name)) and name not in known:
+                    doomed.append((name, None))
+            
+            total = sum(sizes[entry["id"]] for entry in entries)
+            for entry in entries:
+                expired = purge_all or (cutoff is not None and entry["time"] < cutoff)
+                over_size = max_bytes is not None and total > max_bytes
+                if not expired and not over_size:
+                    continue
+                os.remove(self.entry_path(entry["id"]))
+                total -= sizes[entry["id"]]
+                doomed.append((entry["id"], sizes[entry["id"]]))
+        
+        # 锁外删除内容；中途取消只会留下无记录的目录，下次清理时删除
+        removed = 0
+        freed = 0
+        for index, (entry_id, size) in enumerate(doomed):
+            if task:
+                task.check_cancelled()
+                task.report(index, len(doomed), "清理回收站")
+            shutil.rmtree(os.path.join(self.trash_dir, entry_id), ignore_errors=True)
+            if size is not None:
+                removed += 1
+                freed += size
+        return removed, freed
+
+def is_sidecar_file(name, names):
+    """是否为题目的附属文件（元数据、OCR结果、旧版备份），names为同目录下的文件名集合"""
+    if name.endswith(".backup"):
+        return True
+    for suffix in (".meta", "_ocr.txt", "_ocr.npz"):
+        if name.endswith(suffix):
+            base = name[:-len(suffix)]
+            return any(f"{base}{ext}" in names for ext in ('.jpg', '.jpeg', '.png', '.bmp', '.gif'))
+    return False
+
+class LibraryEvents:
+    """题库变更事件总线
+    
+    文件操作完成后发布事件，文件列表、统计和搜索索引订阅后各自只更新受影响的部分。
+    事件为(类型, 路径, 新路径)：类型为added/removed/renamed/modified，路径是列表中的一项
+    （题目图片及其附属文件算一项，或文件夹），新路径只用于renamed。只在界面线程中发布。
+    """
+    
+    def __init__(self):
+        self.subscribers = []
+    
+    def subscribe(self, callback):
+        """订阅事件，callback(events)每批事件调用一次"""
+        self.subscribers.append(callback)
+    
+    def publish(self, kind, path, new_path=None):
+        """发布单个事件"""
+        self.publish_batch([(kind, path, new_path)])
+    
+    def publish_batch(self, events):
+        """发布一批事件，订阅者一次处理完，界面只更新一次"""
+        if not events:
+            return
+        for callback in self.subscribers:
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"处理题库变更失败: {e}")
+
+class LibraryStats:
+    """题库统计
+    
+    按题目记录大小（含附属文件）、学科、标签和月份，总数及各学科、标签、月份的数量作为聚合值随变更事件增减，
+    每道题的变更是O(1)。统计快照持久化到JSON文件，启动时直接读取，不扫描错题目录；快照同时记录
+    每个文件夹的修改时间，程序外的增删改名只需重新扫描修改时间变化的文件夹。
+    """
+    
+    def __init__(self, library_dir, cache_file=None):
+        self.library_dir = library_dir
+        self.cache_file = cache_file
+        self.reset()
+        self.loaded = False
+        
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for rel_path, record in data["items"].items():
+                    self.add_item(self.absolute_path(rel_path), (record[0], record[1], tuple(record[2]), record[3]))
+                for rel_dir, mtime in data["dirs"].items():
+                    self.dir_mtimes[self.absolute_path(rel_dir)] = mtime
+                self.dirty = False
+                self.loaded = True
+            except Exception as e:
+                print(f"加载统计快照失败: {e}")
+                self.reset()
+    
+    def reset(self):
+        """清空统计"""
+        self.items = {}  # 路径 -> (大小, 学科, 标签, 月份)
+        self.dirs = {}  # 文件夹 -> 直接包含的题目路径集合
+        self.dir_mtimes = {}  # 文件夹 -> 上次扫描时的修改时间
+        self.total_size = 0
+        self.by_subject = {}
+        self.by_tag = {}
+        self.by_month = {}
+        self.dirty = True
+    
+    def absolute_path(self, rel_path):
+        """快照中的相对路径转为完整路径"""
+        return os.path.join(self.library_dir, *rel_path.split("/")) if rel_path else self.library_dir
+    
+    def relative_path(self, path):
+        """完整路径转为快照中的相对路径"""
+        rel_path = os.path.relpath(path, self.library_dir)
+        return "" if rel_path == "." else rel_path.replace(os.sep, "/")
+    
+    def save(self):
+        """有变化时原子写入统计快照"""
+        if not self.cache_file or not self.dirty:
+            return
+        data = {
+            "items": {self.relative_path(path): [size, subject, list(tags), month]
+                      for path, (size, subject, tags, month) in self.items.items()},
+            "dirs": {self.relative_path(path): mtime for path, mtime in self.dir_mtimes.items()}
+        }
+        try:
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+            self.dirty = False
+        except Exception as e:
+            print(f"保存统计快照失败: {e}")
+    
+    def summary(self):
+        """统计结果{"total_files", "total_size", "by_subject", "by_tag", "by_month"}"""
+        return {"total_files": len(self.items), "total_size": self.total_size, "by_subject": dict(self.by_subject),
+                "by_tag": dict(self.by_tag), "by_month": dict(self.by_month)}
+    
+    def read_item(self, path):
+        """读取一道题的统计信息(大小, 学科, 标签, 月份)，大小包含其附属文件"""
+        size = 0
+        for file_path in question_files(path):
+            try:
+                size += os.path.getsize(file_path)
+            except OSError:
+                pass
+        subject = os.path.basename(os.path.dirname(path))
+        
+        tags = ()
+        meta_file = f"{os.path.splitext(path)[0]}.meta"
+        if os.path.exists(meta_file):
+            try:
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    tag_text = json.load(f).get("tags", "")
+                tags = tuple(sorted({tag.strip() for tag in tag_text.replace("，", ",").split(",") if tag.strip()}))
+            except Exception as e:
+                print(f"读取元数据失败 {meta_file}: {e}")
+        
+        month = datetime.datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m")
+        return size, subject, tags, month
+    
+    def count(self, counter, key, delta):
+        """聚合计数加减，减到0时删除键"""
+        value = counter.get(key, 0) + delta
+        if value:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+    
+    def add_item(self, path, record=None):
+        """登记一道题"""
+        if path in self.items:
+            self.remove_item(path)
+        size, subject, tags, month = record or self.read_item(path)
+        self.items[path] = (size, subject, tags, month)
+        self.dirs.setdefault(os.path.dirname(path), set()).add(path)
+        self.total_size += size
+        self.count(self.by_subject, subject, 1)
+        self.count(self.by_month, month, 1)
+        for tag in tags:
+            self.count(self.by_tag, tag, 1)
+        self.dirty = True
+    
+    def remove_item(self, path):
+        """注销一道题"""
+        size, subject, tags, month = self.items.pop(path)
+        self.dirs[os.path.dirname(path)].discard(path)
+        self.total_size -= size
+        self.count(self.by_subject, subject, -1)
+        self.count(self.by_month, month, -1)
+        for tag in tags:
+            self.count(self.by_tag, tag, -1)
+        self.dirty = True
+    
+    def scan_dir(self, directory):
+        """重新扫描一个文件夹中直接包含的题目，返回其中的子文件夹"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            names = os.listdir(directory)
+        except OSError:
+            self.remove_tree(directory)
+            return []
+        name_set = set(names)
+        subdirs = []
+        present = set()
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                subdirs.append(path)
+            elif not name.startswith('.') and not is_sidecar_file(name, name_set):
+                present.add(path)
+                self.add_item(path)
+        for path in self.dirs.get(directory, set()) - present:
+            self.remove_item(path)
+        self.dir_mtimes[directory] = mtime
+        self.dirty = True
+        return subdirs
+    
+    def add_tree(self, path):
+        """登记文件或文件夹下的所有题目"""
+        if not os.path.isdir(path):
+            if os.path.isfile(path):
+                self.add_item(path)
+            return
+        pending = [path]
+        while pending:
+            pending.extend(self.scan_dir(pending.pop()))
+    
+    def remove_tree(self, path):
+        """注销文件或文件夹下的所有题目"""
+        if path in self.items:
+            self.remove_item(path)
+            return
+        prefix = path + os.sep
+        for directory in [d for d in set(self.dirs) | set(self.dir_mtimes) if d == path or d.startswith(prefix)]:
+            for item_path in list(self.dirs.get(directory, ())):
+                self.remove_item(item_path)
+            self.dirs.pop(directory, None)
+            self.dir_mtimes.pop(directory, None)
+        self.dirty = True
+    
+    def scan(self):
+        """重新扫描整个错题目录"""
+        self.reset()
+        self.add_tree(self.library_dir)
+    
+    def changed_dirs(self, dir_mtimes):
+        """找出修改时间与快照不同的文件夹（只读取文件夹属性，可在工作线程中调用）"""
+        changed = []
+        for directory, mtime in dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    changed.append(directory)
+            except OSError:
+                changed.append(directory)
+        return changed
+    
+    def rescan_dirs(self, directories):
+        """重新扫描发生变化的文件夹，新出现的子文件夹整体登记"""
+        for directory in directories:
+            for subdir in self.scan_dir(directory):
+                if subdir not in self.dir_mtimes:
+                    self.add_tree(subdir)
+    
+    def in_library(self, path):
+        """路径是否在错题目录内"""
+        return path is not None and path.startswith(self.library_dir + os.sep)
+    
+    def apply(self, events):
+        """按变更事件更新统计：先注销全部旧路径再登记新路径，互换名字时不会互相覆盖"""
+        for kind, path, new_path in events:
+            if kind in ("removed", "renamed") and self.in_library(path):
+                self.remove_tree(path)
+        touched = set()
+        for kind, path, new_path in events:
+            target = new_path if kind == "renamed" else path
+            if kind == "removed":
+                touched.add(os.path.dirname(path))
+            elif self.in_library(target):
+                self.add_tree(target)
+                touched.add(os.path.dirname(target))
+            if kind == "renamed":
+                touched.add(os.path.dirname(path))
+        # 自己的操作引起的文件夹修改时间变化不必在下次启动时重新扫描
+        for directory in touched:
+            if directory in self.dir_mtimes:
+                try:
+                    self.dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    pass
+
+class LibraryWatcher:
+    """监视错题目录的外部变化（资源管理器拖入、同步工具、解压等）
+    
+    Linux上使用inotify（通过ctypes调用libc），不可用时退化为轮询各文件夹的修改时间，每次只读取文件夹属性。
+    连续的事件在安静settle秒（最长max_delay秒）后合并为一批交给on_changes({"paths", "dirs", "full"})：
+    paths为变化的文件或文件夹，dirs为需要整体重新扫描的文件夹，full表示需要完整重新读取。
+    变化过多时不再逐个记录文件，改为记录所在文件夹；上一批处理完（调用acknowledge）之前不交付下一批，
+    期间的事件继续合并，界面不会被大批量操作淹没。
+    """
+    
+    def __init__(self, library_dir, on_changes, poll_interval=2.0, settle=0.5, max_delay=3.0, max_paths=1000):
+        self.library_dir = library_dir
+        self.on_changes = on_changes
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.max_delay = max_delay
+        self.max_paths = max_paths
+        self.stop_event = threading.Event()
+        self.idle_event = threading.Event()
+        self.idle_event.set()
+        self.thread = None
+        self.backend = None
+        self.reset_pending()
+    
+    def start(self):
+        """启动监视线程"""
+        self.thread = threading.Thread(target=self.run, name="LibraryWatcher")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        """停止监视"""
+        self.stop_event.set()
+        self.idle_event.set()
+    
+    def acknowledge(self):
+        """上一批变化已处理完，可以交付下一批"""
+        self.idle_event.set()
+    
+    def reset_pending(self):
+        """清空待交付的变化"""
+        self.pending_paths = set()
+        self.pending_dirs = set()
+        self.pending_full = False
+        self.first_pending = None
+        self.last_pending = None
+    
+    def add_pending(self, path=None, directory=None, full=False):
+        """记录一个变化；文件过多时改为记录其所在文件夹（背压）"""
+        now = time.monotonic()
+        if self.first_pending is None:
+            self.first_pending = now
+        self.last_pending = now
+        if full:
+            self.pending_full = True
+        if directory is not None:
+            self.pending_dirs.add(directory)
+        if path is not None:
+            if len(self.pending_paths) >= self.max_paths:
+                self.pending_dirs.update(os.path.dirname(p) for p in self.pending_paths)
+                self.pending_paths = set()
+            if self.pending_dirs and os.path.dirname(path) in self.pending_dirs:
+                return
+            self.pending_paths.add(path)
+    
+    def flush_pending(self, force=False):
+        """事件安静下来且界面空闲时交付一批变化"""
+        if self.first_pending is None or not self.idle_event.is_set():
+            return
+        now = time.monotonic()
+        if not force and now - self.last_pending < self.settle and now - self.first_pending < self.max_delay:
+            return
+        batch = {
+            "paths": {path for path in self.pending_paths if os.path.dirname(path) not in self.pending_dirs},
+            "dirs": self.pending_dirs,
+            "full": self.pending_full
+        }
+        self.reset_pending()
+        self.idle_event.clear()
+        self.on_changes(batch)
+    
+    def run(self):
+        """监视线程主循环"""
+        try:
+            self.run_inotify()
+        except Exception as e:
+            if not self.stop_event.is_set():
+                print(f"inotify不可用，改为轮询监视错题目录: {e}")
+                self.run_polling()
+    
+    def list_dirs(self, root_dir):
+        """列出root_dir及其下所有文件夹（跳过隐藏文件夹）"""
+        dirs = [root_dir]
+        pending = [root_dir]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                            dirs.append(entry.path)
+                            pending.append(entry.path)
+            except OSError:
+                pass
+        return dirs
+    
+    def run_inotify(self):
+        """inotify后端"""
+        if not sys.platform.startswith("linux"):
+            raise OSError("仅Linux支持inotify")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.backend = "inotify"
+        watches = {}  # 监视描述符 -> 文件夹
+        
+        def add_watches(root_dir):
+            for directory in self.list_dirs(root_dir):
+                wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    error = ctypes.get_errno()
+                    if error in (errno.ENOSPC, errno.EMFILE):
+                        # 超出系统监视数上限时由上层改为轮询
+                        raise OSError(error, os.strerror(error))
+                    # 文件夹刚被删除或改名（解压、同步工具常见）等，跳过它继续监视其余文件夹
+                    if error not in (errno.ENOENT, errno.ENOTDIR):
+                        print(f"无法监视文件夹 {directory}: {os.strerror(error)}")
+                    continue
+                watches[wd] = directory
+        
+        def remove_watches(root_dir):
+            prefix = root_dir + os.sep
+            for wd, directory in list(watches.items()):
+                if directory == root_dir or directory.startswith(prefix):
+                    libc.inotify_rm_watch(fd, wd)
+                    del watches[wd]
+        
+        try:
+            add_watches(self.library_dir)
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], self.settle / 2)
+                if readable:
+                    try:
+                        data = os.read(fd, 256 * 1024)
+                    except BlockingIOError:
+                        data = b""
+                    offset = 0
+                    while offset < len(data):
+                        wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+                        name = os.fsdecode(data[offset + 16:offset + 16 + length].split(b"\0", 1)[0])
+                        offset += 16 + length
+                        
+                        if mask & IN_Q_OVERFLOW:
+                            # 内核事件队列溢出，丢失的事件只能通过完整重新读取弥补
+                            self.add_pending(full=True)
+                            continue
+                        if mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+                        directory = watches.get(wd)
+                        if directory is None or not name or name.startswith('.'):
+                            continue
+                        path = os.path.join(directory, name)
+                        if mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO):
+                                add_watches(path)
+                            elif mask & IN_MOVED_FROM:
+                                remove_watches(path)
+                        self.add_pending(path=path)
+                self.flush_pending()
+        finally:
+            os.close(fd)
+    
+    def run_polling(self):
+        """轮询后端：定期比较各文件夹的修改时间，变化的文件夹整体重新扫描"""
+        self.backend = "polling"
+        dir_mtimes = {}
+        
+        def add_dirs(root_dir):
+            for directory in self.list_dirs(root_dir):
+                try:
+                    dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    pass
+        
+        add_dirs(self.library_dir)
+        while not self.stop_event.wait(self.poll_interval):
+            for directory, mtime in list(dir_mtimes.items()):
+                if directory not in dir_mtimes:
+                    continue
+                try:
+                    current = os.stat(directory).st_mtime_ns
+                except OSError:
+                    # 文件夹被删除或改名，由上一级文件夹的重新扫描处理
+                    prefix = directory + os.sep
+                    for path in [d for d in dir_mtimes if d == directory or d.startswith(prefix)]:
+                        del dir_mtimes[path]
+                    self.add_pending(directory=os.path.dirname(directory))
+                    continue
+                if current != mtime:
+                    dir_mtimes[directory] = current
+                    self.add_pending(directory=directory)
+                    for subdir in self.list_dirs(directory)[1:]:
+                        if subdir not in dir_mtimes:
+                            add_dirs(subdir)
+            # 轮询间隔本身已起到合并作用
+            self.flush_pending(force=True)
+
+def sidecar_owner(path, known_items=()):
+    """附属文件所属题目图片的路径（图片已删除时从known_items中查找），不是附属文件时返回path本身"""
+    name = os.path.basename(path)
+    if name.endswith(".backup"):
+        return path[:-len(".backup")]
+    for suffix in (".meta", "_ocr.txt", "_ocr.npz"):
+        if name.endswith(suffix):
+            base = path[:-len(suffix)]
+            for ext in ('.jpg', '.jpeg', '.png', '.bmp', '.gif'):
+                if os.path.exists(base + ext) or base + ext in known_items:
+                    return base + ext
+    return path
 
 class WrongQuestionTool:
     def __init__(self):
@@ -45,15 +2946,37 @@ class WrongQuestionTool:
         self.cuoti_dir = os.path.join(self.program_dir, "CuoTi")
         self.config_file = os.path.join(self.program_dir, "config.json")
         self.themes_dir = os.path.join(self.program_dir, "themes")
+        self.cache_dir = os.path.join(self.program_dir, "cache")
         
         # 创建必要目录
-        for dir_path in [self.cuoti_dir, self.themes_dir]:
+        for dir_path in [self.cuoti_dir, self.themes_dir, self.cache_dir]:
             if not os.path.exists(dir_path):
                 os.makedirs(dir_path)
         
         # 加载配置
         self.config = self.load_config()
         
+        # 图片尺寸缓存（导出排版使用）
+        self.image_info = ImageInfoCache(os.path.join(self.cache_dir, "image_info.json"))
+        self.render_cache = RenderCache(os.path.join(self.cache_dir, "render"))
+        
+        # 题目编辑历史（保存在错题目录之外）
+        self.versions = VersionStore(os.path.join(self.program_dir, "history"), self.cuoti_dir)
+        
+        # 回收站（与错题目录在同一文件系统上，删除即重命名）
+        self.trash = TrashStore(os.path.join(self.program_dir, "trash"), self.cuoti_dir)
+        
+        # 批量重命名日志，上次中断的重命名在启动时继续完成
+        self.rename_journal = os.path.join(self.cache_dir, "rename_journal.json")
+        try:
+            recovered = recover_batch_rename(self.rename_journal)
+            if recovered:
+                # 编辑历史随题目一起改名
+                self.versions.move_history(recovered)
+                print(f"已完成上次中断的批量重命名: {len(recovered)} 项")
+        except Exception as e:
+            print(f"恢复批量重命名失败: {e}")
+        
         # 当前路径
         self.current_path = self.cuoti_dir
         self.path_history = [self.cuoti_dir]
@@ -61,16 +2984,58 @@ class WrongQuestionTool:
         # 搜索相关
         self.search_var = tk.StringVar()
         self.search_results = []
+        self.showing_search_results = False
+        self.search_index = {}  # 图片路径 -> OCR文本（小写）
+        
+        # 后台自动OCR：待识别的图片按加入顺序排队，由一个定时器在用户空闲时逐张提交
+        self.auto_ocr_pending = set()
+        self.auto_ocr_queue = deque()
+        self.auto_ocr_timer = None
+        self.auto_ocr_task_handle = None
+        self.last_user_activity = time.monotonic()
+        
+        # 进行中的后台文件操作涉及的路径，及期间推迟处理的目录变化
+        self.app_operations = []
+        self.deferred_changes = {"paths": set(), "dirs": set()}
+        
+        # 任务调度器
+        self.scheduler = TaskScheduler(self.root)
+        self.last_progress_state = None
         
         # 统计信息
-        self.stats = {"total_files": 0, "total_size": 0, "by_subject": {}}
+        self.stats = {"total_files": 0, "total_size": 0, "by_subject": {}, "by_tag": {}, "by_month": {}}
+        self.library_stats = LibraryStats(self.cuoti_dir, os.path.join(self.cache_dir, "stats.json"))
+        self.stats_save_id = None
+        
+        # 题库变更事件：文件列表、统计和搜索索引按事件增量更新
+        self.events = LibraryEvents()
         
         # 快捷键绑定
         self.setup_shortcuts()
         
         self.setup_ui()
+        self.events.subscribe(self.update_search_index)
+        self.events.subscribe(self.update_file_rows)
+        self.events.subscribe(self.update_stats_from_events)
         self.refresh_file_list()
-        self.update_stats()
+        # 有统计快照时直接显示，后台只检查程序外发生变化的文件夹；首次运行时完整统计一次
+        if self.library_stats.loaded:
+            self.show_stats()
+            self.refresh_changed_stats()
+        else:
+            self.update_stats()
+        
+        # 启动界面更新泵
+        self.scheduler.start_pump(self.on_task_progress)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
+        
+        # 后台整理历史版本和回收站
+        self.schedule_history_prune()
+        self.schedule_trash_purge()
+        
+        # 监视错题目录的外部变化
+        self.library_watcher = None
+        self.start_library_watcher()
         
     def setup_style(self):
         """设置主题样式"""
@@ -93,20 +3058,48 @@ class WrongQuestionTool:
     def setup_shortcuts(self):
         """设置快捷键"""
         self.root.bind('<Control-i>', lambda e: self.import_questions())
-        self.root.bind('<Control-r>', lambda e: self.refresh_file_list())
+        self.root.bind('<Control-r>', lambda e: self.reload_library())
         self.root.bind('<Control-f>', lambda e: self.focus_search())
         self.root.bind('<Control-e>', lambda e: self.export_pdf())
-        self.root.bind('<F5>', lambda e: self.refresh_file_list())
+        self.root.bind('<F5>', lambda e: self.reload_library())
         self.root.bind('<Delete>', lambda e: self.delete_item())
         self.root.bind('<F2>', lambda e: self.rename_item())
+        self.root.bind('<Escape>', lambda e: self.cancel_tasks())
+        
+        # 记录用户操作时间，后台任务在用户操作时让出
+        for sequence in ('<Key>', '<Button>', '<Motion>', '<MouseWheel>'):
+            self.root.bind_all(sequence, self.mark_user_activity, add='+')
+    
+    def mark_user_activity(self, event=None):
+        """记录最近一次用户操作时间"""
+        self.last_user_activity = time.monotonic()
     
     def load_config(self):
         """加载配置文件"""
         default_config = {
             "last_subject": "语文",
             "ocr_enabled": True,
+            "ocr_target_x_height": 20,
+            "ocr_max_pixels": 8000000,
+            "auto_ocr_idle_seconds": 2,
+            "ocr_recipe": "otsu",
             "image_quality": 90,
             "export_format": "pdf",
+            "export_profile": "standard",
+            "export_layout": "single",
+            "export_searchable": False,
+            "word_layout": "single",
+            "render_cache_mb": 1024,
+            "backup_volume_mb": 0,
+            "history_keep_last": 10,
+            "history_keep_days": 30,
+            "trash_keep_days": 30,
+            "trash_max_mb": 2048,
+            "watch_library": True,
+            "watch_poll_seconds": 2,
+            "export_split": False,
+            "export_volume_pages": 200,
+            "export_volume_mb": 100,
             "theme": "default",
             "auto_backup": True,
             "show_stats": True,
@@ -159,7 +3152,7 @@ class WrongQuestionTool:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="文件", menu=file_menu)
         file_menu.add_command(label="导入错题", accelerator="Ctrl+I", command=self.import_questions)
-        file_menu.add_command(label="刷新列表", accelerator="Ctrl+R", command=self.refresh_file_list)
+        file_menu.add_command(label="刷新列表", accelerator="Ctrl+R", command=self.reload_library)
         file_menu.add_separator()
         file_menu.add_command(label="导出为PDF", accelerator="Ctrl+E", command=self.export_pdf)
         file_menu.add_command(label="导出为Word", command=self.export_word)
@@ -167,8 +3160,14 @@ class WrongQuestionTool:
         file_menu.add_separator()
         file_menu.add_command(label="批量重命名", command=self.batch_rename)
         file_menu.add_command(label="创建备份", command=self.create_backup)
+        file_menu.add_command(label="创建压缩备份", command=self.create_archive_backup)
+        file_menu.add_command(label="验证备份", command=self.verify_backup)
+        file_menu.add_command(label="验证压缩备份", command=self.verify_archive_backup)
+        file_menu.add_command(label="恢复备份", command=self.restore_backup)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="回收站", command=self.show_trash)
+        file_menu.add_separator()
+        file_menu.add_command(label="退出", command=self.quit_app)
         
         # 编辑菜单
         edit_menu = tk.Menu(menubar, tearoff=0)
@@ -188,6 +3187,7 @@ class WrongQuestionTool:
         tools_menu.add_command(label="图片裁剪", command=self.image_cropping)
         tools_menu.add_command(label="图片旋转", command=self.image_rotation)
         tools_menu.add_command(label="OCR识别", command=self.ocr_recognition)
+        tools_menu.add_command(label="OCR预处理基准测试", command=self.ocr_benchmark)
         tools_menu.add_separator()
         tools_menu.add_command(label="批量处理", command=self.batch_process)
         tools_menu.add_command(label="搜索文件", accelerator="Ctrl+F", command=self.show_search)
@@ -223,7 +3223,7 @@ class WrongQuestionTool:
         ttk.Button(left_frame, text="导入错题", command=self.import_questions, style='Custom.TButton').pack(side=tk.LEFT, padx=2)
         
         # 刷新按钮
-        ttk.Button(left_frame, text="刷新", command=self.refresh_file_list, style='Custom.TButton').pack(side=tk.LEFT, padx=2)
+        ttk.Button(left_frame, text="刷新", command=self.reload_library, style='Custom.TButton').pack(side=tk.LEFT, padx=2)
         
         # 返回上一级按钮
         ttk.Button(left_frame, text="返回上一级", command=self.go_up, style='Custom.TButton').pack(side=tk.LEFT, padx=2)
@@ -407,10 +3407,69 @@ class WrongQuestionTool:
         selection_label = ttk.Label(right_frame, textvariable=self.selection_var)
         selection_label.pack(side=tk.RIGHT, padx=5)
         
+        # 取消任务按钮
+        ttk.Button(right_frame, text="取消任务", command=self.cancel_tasks).pack(side=tk.RIGHT, padx=5)
+        
         # 进度条
         self.progress = ttk.Progressbar(self.status_bar, mode='indeterminate')
         self.progress.pack(side=tk.BOTTOM, fill=tk.X)
     
+    def on_task_progress(self, active_tasks):
+        """根据运行中的交互任务更新进度条和状态栏（由界面泵定时调用）"""
+        foreground = [task for task in active_tasks if task.priority < PRIORITY_BACKGROUND]
+        
+        state = None
+        if foreground:
+            task = foreground[0]
+            extra = f"（另有 {len(foreground) - 1} 个任务）" if len(foreground) > 1 else ""
+            if task.total:
+                rate = task.rate_text()
+                rate = f"（{rate}）" if rate else ""
+                state = ("determinate", task.done * 100 / task.total,
+                         f"{task.name} {task.done}/{task.total} {task.message}{rate}{extra}")
+            else:
+                state = ("indeterminate", None, f"{task.name} {task.message}{extra}")
+        
+        if state == self.last_progress_state:
+            return
+        previous = self.last_progress_state
+        self.last_progress_state = state
+        
+        if state is None:
+            self.progress.stop()
+            self.progress.config(mode='determinate', value=0)
+            return
+        
+        mode, value, text = state
+        if mode == "determinate":
+            if previous is None or previous[0] != mode:
+                self.progress.stop()
+                self.progress.config(mode='determinate')
+            self.progress.config(value=value)
+        elif previous is None or previous[0] != mode:
+            self.progress.config(mode='indeterminate')
+            self.progress.start()
+        self.status_var.set(text.strip())
+    
+    def cancel_tasks(self):
+        """取消所有交互任务，并清空后台自动OCR队列"""
+        stopped_ocr = self.stop_auto_ocr()
+        if self.scheduler.active_tasks():
+            self.scheduler.cancel_all()
+            self.status_var.set("正在取消任务...")
+        elif stopped_ocr:
+            self.status_var.set("已停止后台OCR")
+    
+    def quit_app(self):
+        """退出程序（先停止所有后台任务）"""
+        self.status_var.set("正在退出...")
+        if self.library_watcher:
+            self.library_watcher.stop()
+        self.scheduler.shutdown()
+        self.image_info.save()
+        self.library_stats.save()
+        self.root.destroy()
+    
     def refresh_file_list(self):
         """刷新文件列表"""
         self.status_var.set("正在刷新...")
@@ -419,46 +3478,30 @@ class WrongQuestionTool:
         # 清空现有项目
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
+        self.showing_search_results = False
         
         try:
             # 添加返回上一级项
             if self.current_path != self.cuoti_dir:
                 parent_dir = os.path.dirname(self.current_path)
                 if parent_dir.startswith(self.cuoti_dir):
-                    self.file_tree.insert("", "end", text="..", values=("返回上一级", "文件夹", "", "", ""), tags=("folder", "parent"))
+                    self.file_tree.insert("", "end", iid="..", text="..", values=("返回上一级", "文件夹", "", "", ""), tags=("folder", "parent"))
             
-            # 添加文件和文件夹
+            # 添加文件和文件夹（题目的附属文件不单独显示）
             items = os.listdir(self.current_path)
             items.sort()
+            names = set(items)
+            items = [item for item in items if not is_sidecar_file(item, names)]
             
+            items = [item for item in items if not item.startswith('.')]
             for item in items:
-                if item.startswith('.'):
-                    continue
-                    
+                # 行标识为完整路径，变更事件据此只更新受影响的行
                 item_path = os.path.join(self.current_path, item)
-                if os.path.isdir(item_path):
-                    # 文件夹
-                    self.file_tree.insert("", "end", text=item, values=(item, "文件夹", "", "", ""), tags=("folder",))
-                else:
-                    # 文件
-                    file_size = os.path.getsize(item_path)
-                    if file_size < 1024:
-                        size_str = f"{file_size} B"
-                    elif file_size < 1024*1024:
-                        size_str = f"{file_size/1024:.1f} KB"
-                    else:
-                        size_str = f"{file_size/(1024*1024):.1f} MB"
-                    
-                    mod_time = os.path.getmtime(item_path)
-                    time_str = datetime.datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M")
-                    
-                    file_type = self.get_file_type(item)
-                    tags = self.get_file_tags(item)
-                    self.file_tree.insert("", "end", text=item, values=(item, file_type, size_str, time_str, tags), tags=("file",))
+                values, tags = self.file_row(item_path)
+                self.file_tree.insert("", "end", iid=item_path, text=item, values=values, tags=tags)
             
             self.path_var.set(self.current_path)
             self.status_var.set(f"已加载 {len(items)} 个项目")
-            self.update_stats()
             
         except Exception as e:
             messagebox.showerror("错误", f"刷新失败: {str(e)}")
@@ -467,6 +3510,229 @@ class WrongQuestionTool:
         finally:
             self.progress.stop()
     
+    def file_row(self, item_path):
+        """文件列表中一行的(values, tags)"""
+        item = os.path.basename(item_path)
+        if os.path.isdir(item_path):
+            return (item, "文件夹", "", "", ""), ("folder",)
+        
+        file_size = os.path.getsize(item_path)
+        if file_size < 1024:
+            size_str = f"{file_size} B"
+        elif file_size < 1024*1024:
+            size_str = f"{file_size/1024:.1f} KB"
+        else:
+            size_str = f"{file_size/(1024*1024):.1f} MB"
+        
+        mod_time = os.path.getmtime(item_path)
+        time_str = datetime.datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M")
+        
+        file_type = self.get_file_type(item)
+        tags = self.get_file_tags(item, os.path.dirname(item_path))
+        return (item, file_type, size_str, time_str, tags), ("file",)
+    
+    def reload_library(self):
+        """重新读取当前文件夹并重新统计整个错题目录（F5）"""
+        self.refresh_file_list()
+        self.update_stats()
+    
+    def update_file_rows(self, events):
+        """按变更事件只增删改当前文件夹中受影响的行，保留选择和滚动位置"""
+        if self.showing_search_results:
+            # 搜索结果中只去掉已不存在的行
+            for kind, path, _ in events:
+                if kind in ("removed", "renamed") and self.file_tree.exists(path):
+                    self.file_tree.delete(path)
+            return
+        if not os.path.isdir(self.current_path):
+            # 当前文件夹本身被改名时跟随到新位置，被删除时回到错题目录
+            new_current = self.cuoti_dir
+            for kind, path, new_path in events:
+                if kind == "renamed" and (self.current_path + os.sep).startswith(path + os.sep):
+                    new_current = new_path + self.current_path[len(path):]
+            self.current_path = new_current if os.path.isdir(new_current) else self.cuoti_dir
+            self.path_history = [self.cuoti_dir]
+            if self.current_path != self.cuoti_dir:
+                self.path_history.append(self.current_path)
+            self.refresh_file_list()
+            return
+        
+        affected = [event for event in events
+                    if os.path.dirname(event[1]) == self.current_path
+                    or (event[2] and os.path.dirname(event[2]) == self.current_path)]
+        # 大批量变更时整体重建更快
+        if len(affected) > 500:
+            self.refresh_file_list()
+            return
+        
+        # 先删除旧行再插入新行，互换名字时不会误删
+        for kind, path, new_path in affected:
+            if kind in ("removed", "renamed") and self.file_tree.exists(path):
+                self.file_tree.delete(path)
+        for kind, path, new_path in affected:
+            target = new_path if kind == "renamed" else path
+            if kind != "removed" and os.path.dirname(target) == self.current_path:
+                self.insert_file_row(target)
+    
+    def insert_file_row(self, item_path):
+        """按名称顺序插入一行，已存在时只更新内容"""
+        name = os.path.basename(item_path)
+        if name.startswith('.') or not os.path.exists(item_path):
+            if self.file_tree.exists(item_path):
+                self.file_tree.delete(item_path)
+            return
+        values, tags = self.file_row(item_path)
+        if self.file_tree.exists(item_path):
+            self.file_tree.item(item_path, values=values, tags=tags)
+            return
+        
+        rows = [row for row in self.file_tree.get_children() if row != ".."]
+        index = bisect.bisect_left([os.path.basename(row) for row in rows], name)
+        offset = len(self.file_tree.get_children()) - len(rows)
+        self.file_tree.insert("", index + offset, iid=item_path, text=name, values=values, tags=tags)
+    
+    def update_search_index(self, events):
+        """删除、改名后同步OCR搜索索引（内容修改由后台OCR重新写入）"""
+        moved = {}
+        for kind, path, new_path in events:
+            if kind not in ("removed", "renamed"):
+                continue
+            prefix = path + os.sep
+            for indexed_path in [p for p in self.search_index if p == path or p.startswith(prefix)]:
+                text = self.search_index.pop(indexed_path)
+                if kind == "renamed":
+                    moved[new_path + indexed_path[len(path):]] = text
+        self.search_index.update(moved)
+    
+    def start_library_watcher(self):
+        """启动错题目录监视（inotify，不可用时轮询）"""
+        if not self.config.get("watch_library", True):
+            return
+        self.library_watcher = LibraryWatcher(
+            self.cuoti_dir, lambda batch: self.scheduler.call_in_ui(self.apply_external_changes, batch),
+            poll_interval=float(self.config.get("watch_poll_seconds", 2)))
+        self.library_watcher.start()
+    
+    def apply_external_changes(self, batch):
+        """把监视到的一批变化转为题库变更事件；本程序自己的操作已经发布过事件，不会重复处理"""
+        try:
+            self.process_external_changes(batch)
+        except Exception as e:
+            print(f"处理错题目录变化失败: {e}")
+        finally:
+            self.library_watcher.acknowledge()
+    
+    def process_external_changes(self, batch):
+        """处理一批目录变化，为新增的图片安排自动OCR"""
+        if batch["full"]:
+            self.reload_library()
+            return
+        events = self.external_change_events(batch)
+        if not events:
+            return
+        self.events.publish_batch(events)
+        for kind, path, _ in events:
+            # 已有OCR结果的题目（如从别处复制来的）不再重新识别
+            if kind == "added" and not os.path.exists(self.get_ocr_text_path(path)):
+                self.queue_auto_ocr(path)
+        self.status_var.set(f"检测到错题目录的外部变化: {len(events)} 项")
+    
+    def begin_app_operation(self, paths):
+        """登记一个后台文件操作涉及的文件夹或题目路径，返回用于end_app_operation的标识
+        
+        复制、移动等耗时操作结束时才一次发布变更事件，期间监视到的这些路径的变化
+        不当作外部变化处理，避免重复的新增事件和自动OCR。
+        """
+        operation = [os.path.normpath(path) for path in paths]
+        self.app_operations.append(operation)
+        return operation
+    
+    def end_app_operation(self, operation):
+        """操作的变更事件发布后调用；所有操作结束时重新核对推迟的变化，只留下真正的外部变化"""
+        self.app_operations.remove(operation)
+        if self.app_operations or not (self.deferred_changes["paths"] or self.deferred_changes["dirs"]):
+            return
+        batch = {"paths": self.deferred_changes["paths"], "dirs": self.deferred_changes["dirs"], "full": False}
+        self.deferred_changes = {"paths": set(), "dirs": set()}
+        try:
+            self.process_external_changes(batch)
+        except Exception as e:
+            print(f"处理错题目录变化失败: {e}")
+    
+    def in_app_operation(self, path):
+        """路径是否属于进行中的本程序文件操作"""
+        return any(path == root or path.startswith(root + os.sep)
+                   for operation in self.app_operations for root in operation)
+    
+    def external_change_events(self, batch):
+        """与统计中记录的题目对比，得出真正发生的新增、删除、修改
+        
+        进行中的本程序操作涉及的路径记入deferred_changes，等操作结束后再核对。
+        """
+        stats = self.library_stats
+        events = {}
+        added_dirs = set()
+        
+        def under_added_dir(path):
+            # 新文件夹会整体登记，其中的文件和子文件夹不再单独处理
+            parent = os.path.dirname(path)
+            while parent not in added_dirs and len(parent) > len(self.cuoti_dir):
+                parent = os.path.dirname(parent)
+            return parent in added_dirs
+        
+        def check_item(path):
+            if self.in_app_operation(path):
+                # 进行中的本程序操作涉及的题目，等操作结束后再核对
+                self.deferred_changes["paths"].add(path)
+                return
+            known = path in stats.items or path in stats.dir_mtimes
+            if not os.path.exists(path):
+                if known:
+                    events[path] = ("removed", path, None)
+            elif os.path.isdir(path):
+                if not known:
+                    events[path] = ("added", path, None)
+                    added_dirs.add(path)
+            elif not known:
+                events[path] = ("added", path, None)
+            elif stats.read_item(path) != stats.items[path]:
+                events[path] = ("modified", path, None)
+        
+        # 按路径长度处理，上级文件夹先于其中的文件和子文件夹
+        changes = [(directory, True) for directory in batch["dirs"]] + [(path, False) for path in batch["paths"]]
+        for path, rescan in sorted(changes, key=lambda change: len(change[0])):
+            if under_added_dir(path):
+                continue
+            if rescan and self.in_app_operation(path):
+                self.deferred_changes["dirs"].add(path)
+                continue
+            if not rescan or not os.path.isdir(path):
+                # 单个文件的变化：附属文件的变化归到所属题目
+                check_item(sidecar_owner(path, stats.items))
+                continue
+            
+            # 整体重新扫描的文件夹：与记录的题目和子文件夹逐一对比
+            names = os.listdir(path)
+            name_set = set(names)
+            present = set()
+            for name in names:
+                item_path = os.path.join(path, name)
+                if name.startswith('.') or (is_sidecar_file(name, name_set) and not os.path.isdir(item_path)):
+                    continue
+                present.add(item_path)
+                check_item(item_path)
+            known = stats.dirs.get(path, set()) | {d for d in stats.dir_mtimes if os.path.dirname(d) == path}
+            for item_path in known - present:
+                check_item(item_path)
+        
+        return list(events.values())
+    
+    def update_stats_from_events(self, events):
+        """按变更事件更新统计"""
+        self.library_stats.apply(events)
+        self.show_stats()
+        self.schedule_stats_save()
+    
     def get_file_type(self, filename):
         """获取文件类型"""
         ext = os.path.splitext(filename)[1].lower()
@@ -481,14 +3747,15 @@ class WrongQuestionTool:
             '.doc': 'Word文档',
             '.docx': 'Word文档',
             '.txt': '文本文件',
-            '.meta': '元数据'
+            '.meta': '元数据',
+            '.npz': 'OCR数据'
         }
         return type_map.get(ext, '未知类型')
     
-    def get_file_tags(self, filename):
+    def get_file_tags(self, filename, directory=None):
         """获取文件标签"""
         try:
-            meta_file = os.path.join(self.current_path, f"{os.path.splitext(filename)[0]}.meta")
+            meta_file = os.path.join(directory or self.current_path, f"{os.path.splitext(filename)[0]}.meta")
             if os.path.exists(meta_file):
                 with open(meta_file, 'r', encoding='utf-8') as f:
                     metadata = json.load(f)
@@ -498,47 +3765,58 @@ class WrongQuestionTool:
         return ''
     
     def update_stats(self):
-        """更新统计信息"""
+        """重新扫描错题目录并更新统计信息"""
         try:
-            total_files = 0
-            total_size = 0
-            by_subject = {}
-            
-            for root, dirs, files in os.walk(self.cuoti_dir):
-                for file in files:
-                    if not file.startswith('.'):
-                        file_path = os.path.join(root, file)
-                        if os.path.isfile(file_path):
-                            total_files += 1
-                            total_size += os.path.getsize(file_path)
-                            
-                            # 按学科统计
-                            subject = os.path.basename(root)
-                            if subject not in by_subject:
-                                by_subject[subject] = 0
-                            by_subject[subject] += 1
-            
-            self.stats = {
-                "total_files": total_files,
-                "total_size": total_size,
-                "by_subject": by_subject
-            }
-            
-            # 格式化大小
-            if total_size < 1024:
-                size_str = f"{total_size} B"
-            elif total_size < 1024*1024:
-                size_str = f"{total_size/1024:.1f} KB"
-            elif total_size < 1024*1024*1024:
-                size_str = f"{total_size/(1024*1024):.1f} MB"
-            else:
-                size_str = f"{total_size/(1024*1024*1024):.1f} GB"
-            
-            stats_text = f"总计: {total_files} 个文件, {size_str}"
-            self.stats_var.set(stats_text)
-            
+            self.library_stats.scan()
         except Exception as e:
+            print(f"统计失败: {e}")
             self.stats_var.set("统计信息加载失败")
+            return
+        self.show_stats()
+        self.library_stats.save()
+    
+    def refresh_changed_stats(self):
+        """后台检查快照之后在程序外发生变化的文件夹，只重新统计这些文件夹"""
+        dir_mtimes = dict(self.library_stats.dir_mtimes)
+        
+        def on_done(changed):
+            if changed:
+                self.library_stats.rescan_dirs(changed)
+                self.show_stats()
+                self.schedule_stats_save()
+        
+        self.scheduler.submit("检查统计", lambda task: self.library_stats.changed_dirs(dir_mtimes), pool="io",
+                              priority=PRIORITY_BACKGROUND, on_done=on_done)
+    
+    def schedule_stats_save(self):
+        """合并短时间内的多次变更，稍后保存一次统计快照"""
+        if self.stats_save_id is not None:
+            self.root.after_cancel(self.stats_save_id)
+        
+        def save():
+            self.stats_save_id = None
+            self.library_stats.save()
+        
+        self.stats_save_id = self.root.after(2000, save)
+    
+    def show_stats(self):
+        """显示当前统计信息"""
+        self.stats = self.library_stats.summary()
+        total_files = self.stats["total_files"]
+        total_size = self.stats["total_size"]
+        
+        # 格式化大小
+        if total_size < 1024:
+            size_str = f"{total_size} B"
+        elif total_size < 1024*1024:
+            size_str = f"{total_size/1024:.1f} KB"
+        elif total_size < 1024*1024*1024:
+            size_str = f"{total_size/(1024*1024):.1f} MB"
+        else:
+            size_str = f"{total_size/(1024*1024*1024):.1f} GB"
+        
+        stats_text = f"总计: {total_files} 个文件, {size_str}"
+        self.stats_var.set(stats_text)
     
     def focus_search(self):
         """聚焦搜索框"""
@@ -563,13 +3841,18 @@ class WrongQuestionTool:
         # 清空现有选择
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
+        self.showing_search_results = True
         
         try:
             # 递归搜索
             for root, dirs, files in os.walk(self.current_path):
                 for file in files:
-                    if search_term.lower() in file.lower():
-                        file_path = os.path.join(root, file)
+                    file_path = os.path.join(root, file)
+                    # 匹配文件名或图片的OCR文本
+                    matched = search_term.lower() in file.lower()
+                    if not matched and file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
+                        matched = search_term.lower() in self.get_indexed_text(file_path)
+                    if matched:
                         relative_path = os.path.relpath(file_path, self.current_path)
                         
                         file_size = os.path.getsize(file_path)
@@ -586,7 +3869,7 @@ class WrongQuestionTool:
                         file_type = self.get_file_type(file)
                         tags = self.get_file_tags(file)
                         
-                        self.file_tree.insert("", "end", text=file, 
+                        self.file_tree.insert("", "end", iid=file_path, text=file, 
                                              values=(file, file_type, size_str, time_str, tags), 
                                              tags=("file",))
                         self.search_results.append(file_path)
@@ -745,6 +4028,7 @@ class WrongQuestionTool:
         
         # 复制文件
         success_count = 0
+        imported = []
         for file_path in files:
             try:
                 filename = os.path.basename(file_path)
@@ -760,16 +4044,28 @@ class WrongQuestionTool:
                 dest_path = os.path.join(subject_dir, new_filename)
                 shutil.copy2(file_path, dest_path)
                 success_count += 1
+                imported.append(("added", dest_path, None))
+                
+                # 记录图片尺寸，导出排版时无需重新打开
+                try:
+                    self.image_info.get_size(dest_path)
+                except Exception as e:
+                    print(f"读取图片尺寸失败: {e}")
+                
+                # 空闲时自动OCR，导入后即可被搜索
+                self.queue_auto_ocr(dest_path)
                 
             except Exception as e:
                 messagebox.showwarning("导入警告", f"导入文件 {filename} 失败: {str(e)}")
         
         if success_count > 0:
+            self.events.publish_batch(imported)
             messagebox.showinfo("导入完成", f"成功导入 {success_count} 个错题文件")
-            # 刷新列表
-            self.current_path = subject_dir
-            self.path_history = [self.cuoti_dir, subject_dir]
-            self.refresh_file_list()
+            # 切换到学科文件夹
+            if self.current_path != subject_dir:
+                self.current_path = subject_dir
+                self.path_history = [self.cuoti_dir, subject_dir]
+                self.refresh_file_list()
         else:
             messagebox.showwarning("导入失败", "没有成功导入任何文件")
     
@@ -799,7 +4095,9 @@ class WrongQuestionTool:
         """显示右键菜单"""
         item = self.file_tree.identify_row(event.y)
         if item:
-            self.file_tree.selection_set(item)
+            # 在已选中的项目上右键时保留多选
+            if item not in self.file_tree.selection():
+                self.file_tree.selection_set(item)
             context_menu = tk.Menu(self.root, tearoff=0)
             
             # 基本操作
@@ -821,6 +4119,7 @@ class WrongQuestionTool:
                 context_menu.add_command(label="图片裁剪", command=self.image_cropping)
                 context_menu.add_command(label="图片旋转", command=self.image_rotation)
                 context_menu.add_command(label="OCR识别", command=self.ocr_recognition)
+                context_menu.add_command(label="历史版本", command=self.show_history)
                 context_menu.add_separator()
             
             # 导出操作
@@ -850,125 +4149,119 @@ class WrongQuestionTool:
         if not new_name or new_name == old_name:
             return
         
-        old_path = os.path.join(self.current_path, old_name)
-        new_path = os.path.join(self.current_path, new_name)
-        
-        if os.path.exists(new_path):
-            messagebox.showerror("错误", "目标名称已存在")
+        # 与批量重命名相同：附属文件一起改名，历史版本随之转移
+        groups, conflicts = plan_batch_rename(self.current_path, [(old_name, new_name)])
+        if conflicts:
+            messagebox.showerror("错误", f"无法重命名: {conflicts[old_name]}")
             return
         
         try:
-            os.rename(old_path, new_path)
-            self.refresh_file_list()
+            renamed = execute_batch_rename(self.current_path, groups, self.rename_journal)
+            self.versions.move_history(renamed)
+            self.events.publish_batch([("renamed", old_path, new_path) for old_path, new_path in renamed])
             self.status_var.set(f"已重命名: {old_name} -> {new_name}")
         except Exception as e:
             messagebox.showerror("错误", f"重命名失败: {str(e)}")
     
+    def get_selected_paths(self):
+        """选中项目的完整路径列表（不含“返回上一级”）"""
+        # 行标识即完整路径（搜索结果中的文件也一样）
+        return [item for item in self.file_tree.selection() if item != ".."]
+    
+    def describe_selection(self, paths):
+        """确认对话框中对选中项目的描述"""
+        if len(paths) == 1:
+            return f"'{os.path.basename(paths[0])}'"
+        return f"选中的 {len(paths)} 项"
+    
     def delete_item(self):
-        """删除项目"""
-        selection = self.file_tree.selection()
-        if not selection:
-            messagebox.showwarning("警告", "请先选择一个项目")
+        """删除选中项目（移入回收站）"""
+        paths = self.get_selected_paths()
+        if not paths:
+            if not self.file_tree.selection():
+                messagebox.showwarning("警告", "请先选择一个项目")
             return
         
-        item = selection[0]
-        name = self.file_tree.item(item, "values")[0]
-        
-        if name == "返回上一级":
+        if not messagebox.askyesno("确认删除", f"确定要删除{self.describe_selection(paths)}吗？删除的内容可在回收站中还原。"):
             return
         
-        if not messagebox.askyesno("确认删除", f"确定要删除 '{name}' 吗？此操作不可恢复！"):
-            return
+        results = {"done": [], "failed": []}
+        operation = self.begin_app_operation(paths)
+        
+        def delete_task(task):
+            for index, path in enumerate(paths):
+                task.check_cancelled()
+                task.report(index, len(paths), os.path.basename(path))
+                try:
+                    self.trash.move_to_trash(path)
+                    results["done"].append((path, None))
+                except Exception as e:
+                    results["failed"].append((path, e))
+            return results
         
-        item_path = os.path.join(self.current_path, name)
+        def finish(*args):
+            self.finish_batch_operation("删除", "已移入回收站", results, "removed")
+            self.end_app_operation(operation)
+            self.schedule_trash_purge()
         
-        try:
-            if os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-            else:
-                os.remove(item_path)
-            
-            self.refresh_file_list()
-            self.status_var.set(f"已删除: {name}")
-        except Exception as e:
-            messagebox.showerror("错误", f"删除失败: {str(e)}")
+        self.scheduler.submit("删除", delete_task, pool="io", on_done=finish, on_error=finish, on_cancel=finish)
     
     def copy_item(self):
-        """复制项目"""
-        selection = self.file_tree.selection()
-        if not selection:
-            messagebox.showwarning("警告", "请先选择一个项目")
-            return
-        
-        item = selection[0]
-        name = self.file_tree.item(item, "values")[0]
-        
-        if name == "返回上一级":
+        """复制选中项目"""
+        self.transfer_selection(move=False)
+    
+    def move_item(self):
+        """移动选中项目"""
+        self.transfer_selection(move=True)
+    
+    def transfer_selection(self, move):
+        """在后台把选中的文件夹或题目（含附属文件）复制或移动到所选目录"""
+        paths = self.get_selected_paths()
+        if not paths:
+            if not self.file_tree.selection():
+                messagebox.showwarning("警告", "请先选择一个项目")
             return
         
-        source_path = os.path.join(self.current_path, name)
-        target_dir = filedialog.askdirectory(title="选择复制目标目录", parent=self.root)
-        
+        verb = "移动" if move else "复制"
+        target_dir = filedialog.askdirectory(title=f"选择{verb}目标目录", parent=self.root)
         if not target_dir:
             return
         
-        try:
-            target_path = os.path.join(target_dir, name)
-            # 确保目标文件名唯一
-            if os.path.exists(target_path):
-                name_parts = os.path.splitext(name)
-                counter = 1
-                while os.path.exists(target_path):
-                    new_name = f"{name_parts[0]}_copy{counter}{name_parts[1]}"
-                    target_path = os.path.join(target_dir, new_name)
-                    counter += 1
-            
-            if os.path.isdir(source_path):
-                shutil.copytree(source_path, target_path)
-            else:
-                shutil.copy2(source_path, target_path)
-            
-            self.status_var.set(f"已复制到: {target_path}")
-            messagebox.showinfo("复制完成", f"已复制到: {target_path}")
-        except Exception as e:
-            messagebox.showerror("错误", f"复制失败: {str(e)}")
-    
-    def move_item(self):
-        """移动项目"""
-        selection = self.file_tree.selection()
-        if not selection:
-            messagebox.showwarning("警告", "请先选择一个项目")
-            return
-        
-        item = selection[0]
-        name = self.file_tree.item(item, "values")[0]
+        results = {"done": [], "failed": []}
+        operation = self.begin_app_operation([target_dir] + (paths if move else []))
         
-        if name == "返回上一级":
-            return
+        def transfer_task(task):
+            try:
+                transfer_items(paths, target_dir, move, task, results)
+            finally:
+                if move:
+                    self.versions.move_history(results["done"])
+            return results
         
-        source_path = os.path.join(self.current_path, name)
-        target_dir = filedialog.askdirectory(title="选择移动目标目录", parent=self.root)
+        def finish(*args):
+            self.finish_batch_operation(verb, f"已{verb}到 {target_dir}", results, "renamed" if move else "added")
+            self.end_app_operation(operation)
         
-        if not target_dir:
-            return
+        self.scheduler.submit(verb, transfer_task, pool="io", on_done=finish, on_error=finish, on_cancel=finish)
+    
+    def finish_batch_operation(self, verb, done_text, results, kind):
+        """批量文件操作结束（完成、出错或取消）后一次发布全部变更并报告结果
         
-        try:
-            target_path = os.path.join(target_dir, name)
-            # 确保目标文件名唯一
-            if os.path.exists(target_path):
-                name_parts = os.path.splitext(name)
-                counter = 1
-                while os.path.exists(target_path):
-                    new_name = f"{name_parts[0]}_move{counter}{name_parts[1]}"
-                    target_path = os.path.join(target_dir, new_name)
-                    counter += 1
-            
-            shutil.move(source_path, target_path)
-            self.refresh_file_list()
-            self.status_var.set(f"已移动到: {target_path}")
-            messagebox.showinfo("移动完成", f"已移动到: {target_path}")
-        except Exception as e:
-            messagebox.showerror("错误", f"移动失败: {str(e)}")
+        kind为removed（删除）、renamed（移动）或added（复制）。
+        """
+        if kind == "added":
+            events = [(kind, target_path, None) for _, target_path in results["done"]]
+        else:
+            events = [(kind, path, target_path) for path, target_path in results["done"]]
+        self.events.publish_batch(events)
+        
+        done_count = len(results["done"])
+        self.status_var.set(f"{done_text}: {done_count} 项" if done_count else f"{verb}未完成")
+        if results["failed"]:
+            lines = [f"{os.path.basename(path)}: {error}" for path, error in results["failed"][:10]]
+            if len(results["failed"]) > 10:
+                lines.append(f"……共 {len(results['failed'])} 项失败")
+            messagebox.showerror("错误", f"{verb}失败:\n" + "\n".join(lines))
     
     def save_edit(self):
         """保存编辑"""
@@ -1016,7 +4309,7 @@ class WrongQuestionTool:
             
             self.status_var.set("编辑已保存")
             messagebox.showinfo("保存成功", "编辑信息已保存")
-            self.refresh_file_list()
+            self.events.publish("modified", os.path.join(self.current_path, filename))
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {str(e)}")
     
@@ -1175,23 +4468,21 @@ class WrongQuestionTool:
                 enhancer = ImageEnhance.Sharpness(processed)
                 processed = enhancer.enhance(sharpness)
             
-            # 备份原图（如果启用自动备份）
-            if self.config.get("auto_backup", True):
-                backup_path = image_path + ".backup"
-                if not os.path.exists(backup_path):
-                    shutil.copy2(image_path, backup_path)
+            # 保存历史版本（如果启用自动备份）
+            self.save_image_version(image_path, "图片预处理")
             
             # 确保目录存在
             os.makedirs(os.path.dirname(image_path), exist_ok=True)
             
             # 保存处理后的图片
             processed.save(image_path, quality=self.config.get("image_quality", 90), optimize=True)
+            self.queue_auto_ocr(image_path)
             
             messagebox.showinfo("处理完成", "图片处理完成，已保存")
             window.destroy()
             
-            # 刷新预览
-            self.refresh_file_list()
+            # 更新列表中的这一行
+            self.events.publish("modified", image_path)
             
             # 如果当前预览的就是这个图片，更新预览
             selection = self.file_tree.selection()
@@ -1354,21 +4645,19 @@ class WrongQuestionTool:
                     messagebox.showerror("错误", "裁剪区域无效")
                     return
                 
-                # 备份原图
-                if self.config.get("auto_backup", True):
-                    backup_path = image_path + ".backup"
-                    if not os.path.exists(backup_path):
-                        shutil.copy2(image_path, backup_path)
+                # 保存历史版本
+                self.save_image_version(image_path, "裁剪")
                 
                 # 裁剪并保存
                 cropped = original_image.crop((left, top, right, bottom))
                 cropped.save(image_path, quality=self.config.get("image_quality", 90), optimize=True)
+                self.queue_auto_ocr(image_path)
                 
                 messagebox.showinfo("裁剪完成", "图片裁剪完成，已保存")
                 crop_window.destroy()
                 
-                # 刷新预览
-                self.refresh_file_list()
+                # 更新列表中的这一行
+                self.events.publish("modified", image_path)
                 
             except Exception as e:
                 messagebox.showerror("错误", f"图片裁剪失败: {str(e)}")
@@ -1436,20 +4725,18 @@ class WrongQuestionTool:
                 # 旋转图片
                 rotated = image.rotate(rotation_angle, expand=True, fillcolor='white')
                 
-                # 备份原图
-                if self.config.get("auto_backup", True):
-                    backup_path = image_path + ".backup"
-                    if not os.path.exists(backup_path):
-                        shutil.copy2(image_path, backup_path)
+                # 保存历史版本
+                self.save_image_version(image_path, "旋转")
                 
                 # 保存旋转后的图片
                 rotated.save(image_path, quality=self.config.get("image_quality", 90), optimize=True)
+                self.queue_auto_ocr(image_path)
                 
                 messagebox.showinfo("旋转完成", f"图片已旋转 {rotation_angle}°")
                 rotation_window.destroy()
                 
-                # 刷新预览
-                self.refresh_file_list()
+                # 更新列表中的这一行
+                self.events.publish("modified", image_path)
                 
             except Exception as e:
                 messagebox.showerror("错误", f"图片旋转失败: {str(e)}")
@@ -1476,58 +4763,606 @@ class WrongQuestionTool:
         except Exception as e:
             label.config(image="", text=f"无法显示图片: {str(e)}")
     
-    def ocr_recognition(self):
-        """OCR文字识别"""
+    def normalize_ocr_resolution(self, gray):
+        """按文字高度归一化OCR输入分辨率，返回(缩放后图片, 缩放比例)"""
+        height, width = gray.shape[:2]
+        target_x_height = self.config.get("ocr_target_x_height", 20)
+        max_pixels = self.config.get("ocr_max_pixels", 8000000)
+        
+        # 在缩小的副本上估计文字高度，避免大图的连通域分析过慢
+        probe_scale = min(1.0, 2000 / max(width, height))
+        if probe_scale < 1.0:
+            probe = cv2.resize(gray, (int(width * probe_scale), int(height * probe_scale)),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            probe = gray
+        
+        # 连通域统计（文字为前景）
+        _, binary = cv2.threshold(probe, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        
+        scale = 1.0
+        if count > 1:
+            comp_w = stats[1:, cv2.CC_STAT_WIDTH]
+            comp_h = stats[1:, cv2.CC_STAT_HEIGHT]
+            comp_area = stats[1:, cv2.CC_STAT_AREA]
+            
+            # 过滤噪点、表格线和大块图形
+            mask = ((comp_h >= 3) & (comp_area >= 6) &
+                    (comp_h < probe.shape[0] * 0.2) &
+                    (comp_w < comp_h * 8) & (comp_w * 8 > comp_h))
+            if np.count_nonzero(mask) >= 10:
+                text_height = float(np.median(comp_h[mask])) / probe_scale
+                scale = target_x_height / text_height
+                scale = max(0.25, min(4.0, scale))
+        
+        # 限制总像素数，保证单张图片的OCR耗时有上界
+        if width * height * scale * scale > max_pixels:
+            scale = (max_pixels / (width * height)) ** 0.5
+        
+        # 接近原尺寸时不做缩放
+        if abs(scale - 1.0) < 0.1:
+            return gray, 1.0
+        
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        resized = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                             interpolation=interpolation)
+        return resized, scale
+    
+    def ocr_recognition(self):
+        """OCR文字识别"""
+        selection = self.file_tree.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个图片文件")
+            return
+        
+        item = selection[0]
+        filename = self.file_tree.item(item, "values")[0]
+        
+        if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
+            messagebox.showwarning("警告", "请选择一个图片文件")
+            return
+        
+        self.status_var.set("正在进行OCR识别...")
+        image_path = os.path.join(self.current_path, filename)
+        
+        def on_error(e):
+            messagebox.showerror("OCR错误", f"OCR识别失败: {str(e)}")
+            self.status_var.set("OCR识别失败")
+        
+        # 由调度器在CPU线程池中运行OCR，结果在界面线程中显示
+        self.scheduler.submit(
+            "OCR识别", lambda task: self.run_ocr(image_path), pool="cpu",
+            on_done=lambda result: self.show_ocr_result(result[0], filename, result[1], result[2]),
+            on_error=on_error,
+            on_cancel=lambda: self.status_var.set("OCR识别已取消"))
+    
+    def apply_ocr_recipe(self, gray, recipe):
+        """按预处理方案处理灰度图"""
+        if recipe == "gray":
+            return gray
+        if recipe == "adaptive":
+            return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         cv2.THRESH_BINARY, 31, 15)
+        if recipe == "flatten_otsu":
+            # 用闭运算估计背景，除以背景消除不均匀光照
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (31, 31))
+            background = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
+            gray = cv2.divide(gray, background, scale=255)
+        elif recipe == "denoise_otsu":
+            gray = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        elif recipe == "median_adaptive":
+            gray = cv2.medianBlur(gray, 3)
+            return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         cv2.THRESH_BINARY, 31, 15)
+        
+        # 默认：全局Otsu阈值
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return thresh
+    
+    def run_ocr(self, image_path, nice=0):
+        """对单张图片执行OCR，返回(文本, 缩放比例, 词级数据)"""
+        # 加载图片；用同一份数据计算内容哈希，词框与识别的图片内容对应
+        with open(image_path, 'rb') as f:
+            content = f.read()
+        image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("无法加载图片")
+        
+        # 预处理图片
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # 分辨率归一化
+        gray, scale = self.normalize_ocr_resolution(gray)
+        
+        # 按配置的预处理方案处理（由基准测试自动选择）
+        thresh = self.apply_ocr_recipe(gray, self.config.get("ocr_recipe", "otsu"))
+        
+        # OCR识别（一次获取词级结果，文本由词框重建）
+        data = pytesseract.image_to_data(thresh, lang='chi_sim+eng', nice=nice,
+                                         output_type=pytesseract.Output.DICT)
+        words = self.build_ocr_words(data, scale, image.shape[1], image.shape[0])
+        words["image_digest"] = np.array(hashlib.sha1(content).hexdigest())
+        text = self.ocr_words_to_text(words)
+        return text, scale, words
+    
+    def character_error_rate(self, recognized, reference):
+        """计算字符错误率（忽略空白字符的编辑距离 / 参考文本长度）"""
+        recognized = "".join(recognized.split())
+        reference = "".join(reference.split())
+        if not reference:
+            return 0.0 if not recognized else 1.0
+        
+        previous = list(range(len(recognized) + 1))
+        for i, ref_char in enumerate(reference, 1):
+            current = [i]
+            for j, rec_char in enumerate(recognized, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1,
+                                   previous[j - 1] + (ref_char != rec_char)))
+            previous = current
+        return previous[-1] / len(reference)
+    
+    def benchmark_ocr_recipes(self, sample_dir, progress_callback=None):
+        """在标注样本集上测试各预处理方案，返回按优劣排序的结果列表
+        
+        样本集为图片文件及同名的 .gt.txt 标注文本（如 q1.jpg 与 q1.gt.txt）。
+        """
+        samples = []
+        for item in sorted(os.listdir(sample_dir)):
+            if item.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff')):
+                gt_file = os.path.join(sample_dir, f"{os.path.splitext(item)[0]}.gt.txt")
+                if os.path.exists(gt_file):
+                    with open(gt_file, 'r', encoding='utf-8') as f:
+                        samples.append((os.path.join(sample_dir, item), f.read()))
+        
+        if not samples:
+            raise ValueError("样本目录中没有找到带 .gt.txt 标注的图片")
+        
+        totals = {recipe: {"seconds": 0.0, "errors": 0.0, "chars": 0, "samples": 0} for recipe in OCR_RECIPES}
+        for index, (image_path, reference) in enumerate(samples):
+            if progress_callback:
+                progress_callback(index, len(samples), os.path.basename(image_path))
+            
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"无法加载样本图片: {image_path}")
+                continue
+            gray, _ = self.normalize_ocr_resolution(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            ref_length = len("".join(reference.split()))
+            
+            for recipe in OCR_RECIPES:
+                start = time.perf_counter()
+                processed = self.apply_ocr_recipe(gray, recipe)
+                text = pytesseract.image_to_string(processed, lang='chi_sim+eng')
+                totals[recipe]["seconds"] += time.perf_counter() - start
+                totals[recipe]["errors"] += self.character_error_rate(text, reference) * ref_length
+                totals[recipe]["chars"] += ref_length
+                totals[recipe]["samples"] += 1
+        
+        if not any(total["samples"] for total in totals.values()):
+            raise ValueError("样本目录中的图片都无法加载")
+        
+        results = []
+        for recipe, total in totals.items():
+            results.append({
+                "recipe": recipe,
+                "description": OCR_RECIPES[recipe],
+                # 按实际识别的样本数平均，无法加载的样本不计入
+                "latency": total["seconds"] / total["samples"] if total["samples"] else 0.0,
+                "cer": total["errors"] / total["chars"] if total["chars"] else 0.0
+            })
+        
+        # 错误率优先；错误率相差不到0.5%时选择更快的方案
+        best_cer = min(result["cer"] for result in results)
+        near_best = [result for result in results if result["cer"] - best_cer <= 0.005]
+        others = [result for result in results if result["cer"] - best_cer > 0.005]
+        return sorted(near_best, key=lambda r: r["latency"]) + sorted(others, key=lambda r: r["cer"])
+    
+    def ocr_benchmark(self):
+        """OCR预处理基准测试，并自动选用最佳方案"""
+        sample_dir = filedialog.askdirectory(title="选择标注样本目录（图片 + 同名 .gt.txt）", parent=self.root)
+        if not sample_dir:
+            return
+        
+        self.status_var.set("正在进行OCR预处理基准测试...")
+        
+        def benchmark_task(task):
+            def report(index, total, name):
+                task.check_cancelled()
+                task.report(index, total, name)
+            
+            results = self.benchmark_ocr_recipes(sample_dir, report)
+            
+            # 写入报告和配置
+            with open(os.path.join(sample_dir, "ocr_benchmark.json"), 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.config["ocr_recipe"] = results[0]["recipe"]
+            self.save_config()
+            return results
+        
+        def on_error(e):
+            messagebox.showerror("基准测试错误", f"基准测试失败: {str(e)}")
+            self.status_var.set("基准测试失败")
+        
+        self.scheduler.submit(
+            "OCR基准测试", benchmark_task, pool="cpu",
+            on_done=self.show_benchmark_results, on_error=on_error,
+            on_cancel=lambda: self.status_var.set("基准测试已取消"))
+    
+    def show_benchmark_results(self, results):
+        """显示基准测试结果"""
+        self.status_var.set(f"基准测试完成，已选用: {results[0]['description']}")
+        
+        result_window = tk.Toplevel(self.root)
+        result_window.title("OCR预处理基准测试结果")
+        result_window.geometry("600x320")
+        result_window.transient(self.root)
+        
+        ttk.Label(result_window, text=f"已选用方案: {results[0]['description']}",
+                  style='Header.TLabel').pack(pady=10)
+        
+        result_tree = ttk.Treeview(result_window, columns=("耗时", "错误率"), show="tree headings")
+        result_tree.heading("#0", text="预处理方案")
+        result_tree.heading("耗时", text="平均耗时")
+        result_tree.heading("错误率", text="字符错误率")
+        result_tree.column("#0", width=300)
+        result_tree.column("耗时", width=120)
+        result_tree.column("错误率", width=120)
+        
+        for result in results:
+            result_tree.insert("", "end", text=result["description"],
+                               values=(f"{result['latency']:.2f} 秒", f"{result['cer'] * 100:.1f}%"))
+        
+        result_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        ttk.Button(result_window, text="关闭", command=result_window.destroy).pack(pady=10)
+    
+    def get_ocr_text_path(self, image_path):
+        """获取OCR文本文件路径"""
+        base_name = os.path.splitext(image_path)[0]
+        return f"{base_name}_ocr.txt"
+    
+    def save_ocr_result(self, image_path, text, words=None):
+        """保存OCR文本和词级数据，并更新搜索索引"""
+        with open(self.get_ocr_text_path(image_path), 'w', encoding='utf-8') as f:
+            f.write(text)
+        
+        # 同时保存词框和置信度，供后续功能复用；没有词框时删除旧词框，避免与新文字不一致
+        if words is not None:
+            save_ocr_words(image_path, words)
+        elif os.path.exists(get_ocr_words_path(image_path)):
+            os.remove(get_ocr_words_path(image_path))
+        
+        self.search_index[image_path] = text.lower()
+    
+    def get_indexed_text(self, image_path):
+        """从搜索索引获取图片的OCR文本，未索引时读取OCR文本文件"""
+        if image_path not in self.search_index:
+            text = ""
+            ocr_file = self.get_ocr_text_path(image_path)
+            if os.path.exists(ocr_file):
+                try:
+                    with open(ocr_file, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                except Exception as e:
+                    print(f"读取OCR文件失败: {e}")
+            self.search_index[image_path] = text.lower()
+        return self.search_index[image_path]
+    
+    def save_image_version(self, image_path, action):
+        """编辑覆盖图片前保存历史版本（如果启用自动备份）"""
+        if not self.config.get("auto_backup", True):
+            return
+        try:
+            self.versions.save_version(image_path, action)
+        except Exception as e:
+            print(f"保存历史版本失败: {e}")
+    
+    def schedule_history_prune(self):
+        """在后台导入旧版 .backup 文件并按保留策略清理历史版本"""
+        keep_last = int(self.config.get("history_keep_last", 10))
+        keep_days = int(self.config.get("history_keep_days", 30))
+        
+        def prune_task(task):
+            migrated = self.versions.migrate_backups()
+            task.check_cancelled()
+            return migrated, self.versions.prune(keep_last, keep_days)
+        
+        def on_done(result):
+            migrated, (removed_versions, removed_objects) = result
+            # 删除的 .backup 只影响统计中的大小，只需重新统计这些文件夹
+            if migrated:
+                self.refresh_changed_stats()
+            if migrated or removed_versions:
+                print(f"历史版本整理完成: 导入 {migrated} 个旧备份，清理 {removed_versions} 个版本、"
+                      f"{removed_objects} 个文件")
+        
+        self.scheduler.submit("整理历史版本", prune_task, pool="io", priority=PRIORITY_BACKGROUND,
+                              on_done=on_done)
+    
+    def schedule_trash_purge(self):
+        """在后台按保留天数和总大小彻底删除回收站中的旧内容"""
+        keep_days = int(self.config.get("trash_keep_days", 30))
+        max_bytes = int(self.config.get("trash_max_mb", 2048)) * 1024 * 1024
+        
+        def on_done(result):
+            removed, freed = result
+            if removed:
+                print(f"回收站清理完成: 彻底删除 {removed} 项，释放 {freed / 1024 / 1024:.1f} MB")
+        
+        self.scheduler.submit("清理回收站", lambda task: self.trash.purge(keep_days, max_bytes, task),
+                              pool="io", priority=PRIORITY_BACKGROUND, on_done=on_done)
+    
+    def show_trash(self):
+        """查看回收站，还原或彻底删除"""
+        trash_window = tk.Toplevel(self.root)
+        trash_window.title("回收站")
+        trash_window.geometry("640x400")
+        trash_window.transient(self.root)
+        
+        keep_days = int(self.config.get("trash_keep_days", 30))
+        max_mb = int(self.config.get("trash_max_mb", 2048))
+        ttk.Label(trash_window, text=f"删除的内容保留 {keep_days} 天，回收站超过 {max_mb} MB 时自动清理最早删除的内容"
+                  ).pack(anchor=tk.W, padx=10, pady=(10, 0))
+        
+        columns = ("name", "location", "time")
+        trash_tree = ttk.Treeview(trash_window, columns=columns, show="headings", height=12)
+        trash_tree.heading("name", text="名称")
+        trash_tree.heading("location", text="原位置")
+        trash_tree.heading("time", text="删除时间")
+        trash_tree.column("name", width=200)
+        trash_tree.column("location", width=240)
+        trash_tree.column("time", width=160)
+        trash_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def load_entries():
+            trash_tree.delete(*trash_tree.get_children())
+            # 最近删除的在最上面
+            for entry in reversed(self.trash.list_entries()):
+                location, _, name = entry["path"].rpartition("/")
+                trash_tree.insert("", "end", iid=entry["id"],
+                                  values=(name, location or "CuoTi", entry["time"].replace("T", " ")))
+        
+        def restore():
+            selected = trash_tree.selection()
+            if not selected:
+                messagebox.showwarning("警告", "请选择要还原的项目", parent=trash_window)
+                return
+            restored = []
+            for entry_id in selected:
+                try:
+                    restored.append(self.trash.restore(entry_id))
+                except Exception as e:
+                    messagebox.showerror("错误", f"还原失败: {str(e)}", parent=trash_window)
+                    break
+            load_entries()
+            self.events.publish_batch([("added", path, None) for path in restored])
+            self.status_var.set(f"已还原 {len(restored)} 项")
+        
+        def purge_selected():
+            selected = trash_tree.selection()
+            if not selected:
+                messagebox.showwarning("警告", "请选择要彻底删除的项目", parent=trash_window)
+                return
+            if not messagebox.askyesno("确认删除", f"确定要彻底删除选中的 {len(selected)} 项吗？此操作不可恢复！",
+                                       parent=trash_window):
+                return
+            entry_ids = list(selected)
+            for entry_id in entry_ids:
+                trash_tree.delete(entry_id)
+            
+            def purge_task(task):
+                for index, entry_id in enumerate(entry_ids):
+                    task.report(index, len(entry_ids), "彻底删除")
+                    self.trash.remove_entry(entry_id)
+                return len(entry_ids)
+            
+            self.scheduler.submit("彻底删除", purge_task, pool="io", priority=PRIORITY_BACKGROUND,
+                                  on_done=lambda count: self.status_var.set(f"已彻底删除 {count} 项"))
+        
+        def empty_trash():
+            if not trash_tree.get_children():
+                return
+            if not messagebox.askyesno("确认清空", "确定要清空回收站吗？此操作不可恢复！", parent=trash_window):
+                return
+            trash_tree.delete(*trash_tree.get_children())
+            self.scheduler.submit("清空回收站", lambda task: self.trash.purge(task=task), pool="io",
+                                  priority=PRIORITY_BACKGROUND,
+                                  on_done=lambda result: self.status_var.set(
+                                      f"回收站已清空，释放 {result[1] / 1024 / 1024:.1f} MB"))
+        
+        button_frame = ttk.Frame(trash_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="还原", command=restore).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="彻底删除", command=purge_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="清空回收站", command=empty_trash).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=trash_window.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        load_entries()
+    
+    def show_history(self):
+        """查看并恢复选中题目的历史版本"""
         selection = self.file_tree.selection()
         if not selection:
             messagebox.showwarning("警告", "请先选择一个图片文件")
             return
         
-        item = selection[0]
-        filename = self.file_tree.item(item, "values")[0]
-        
-        if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
-            messagebox.showwarning("警告", "请选择一个图片文件")
+        name = self.file_tree.item(selection[0], "values")[0]
+        image_path = os.path.join(self.current_path, name)
+        versions = self.versions.list_versions(image_path)
+        if not versions:
+            messagebox.showinfo("历史版本", f"'{name}' 没有历史版本")
             return
         
-        self.status_var.set("正在进行OCR识别...")
-        self.progress.start()
-        
-        def ocr_thread():
+        history_window = tk.Toplevel(self.root)
+        history_window.title(f"历史版本 - {name}")
+        history_window.geometry("480x320")
+        history_window.transient(self.root)
+        
+        columns = ("time", "action", "size")
+        version_tree = ttk.Treeview(history_window, columns=columns, show="headings", height=10)
+        version_tree.heading("time", text="时间")
+        version_tree.heading("action", text="编辑操作")
+        version_tree.heading("size", text="大小")
+        version_tree.column("time", width=180)
+        version_tree.column("action", width=140)
+        version_tree.column("size", width=100)
+        version_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # 最新的版本在最上面
+        for index in range(len(versions) - 1, -1, -1):
+            version = versions[index]
+            version_tree.insert("", "end", iid=str(index),
+                                values=(version["time"].replace("T", " "), version["action"],
+                                        f"{version['size'] / 1024:.1f} KB"))
+        
+        def restore():
+            selected = version_tree.selection()
+            if not selected:
+                messagebox.showwarning("警告", "请选择一个版本", parent=history_window)
+                return
+            if not messagebox.askyesno("确认恢复", "恢复后当前图片会先保存为一个历史版本，确定恢复吗？",
+                                       parent=history_window):
+                return
             try:
-                image_path = os.path.join(self.current_path, filename)
-                
-                # 加载图片
-                image = cv2.imread(image_path)
-                if image is None:
-                    raise ValueError("无法加载图片")
-                
-                # 预处理图片
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                
-                # 应用阈值
-                _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                
-                # OCR识别
-                text = pytesseract.image_to_string(thresh, lang='chi_sim+eng')
-                
-                # 在主线程中更新UI
-                self.root.after(0, lambda: self.show_ocr_result(text, filename))
-                
+                self.versions.restore_version(image_path, int(selected[0]))
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("OCR错误", f"OCR识别失败: {str(e)}"))
-                self.root.after(0, lambda: self.status_var.set("OCR识别失败"))
-            finally:
-                self.root.after(0, lambda: self.progress.stop())
+                messagebox.showerror("错误", f"恢复历史版本失败: {str(e)}", parent=history_window)
+                return
+            history_window.destroy()
+            self.queue_auto_ocr(image_path)
+            self.events.publish("modified", image_path)
+            self.preview_file(image_path)
+            self.status_var.set(f"已恢复历史版本: {name}")
+        
+        button_frame = ttk.Frame(history_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="恢复此版本", command=restore).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=history_window.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    def queue_auto_ocr(self, image_path):
+        """将图片加入后台自动OCR队列"""
+        if not self.config.get("ocr_enabled", True):
+            return
+        if not image_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
+            return
+        if image_path in self.auto_ocr_pending:
+            return
+        
+        self.auto_ocr_pending.add(image_path)
+        self.auto_ocr_queue.append(image_path)
+        self.schedule_auto_ocr(0)
+    
+    def schedule_auto_ocr(self, delay):
+        """delay秒后检查是否可以提交下一张；已有定时器或正在识别时不重复安排"""
+        if self.auto_ocr_timer is not None or self.auto_ocr_task_handle is not None:
+            return
+        if self.auto_ocr_queue:
+            self.auto_ocr_timer = self.root.after(int(delay * 1000), self.drain_auto_ocr)
+    
+    def drain_auto_ocr(self):
+        """用户空闲时提交队列中的下一张图片，识别完成后再安排下一张；用户操作时推迟到空闲"""
+        self.auto_ocr_timer = None
+        if not self.auto_ocr_queue:
+            return
+        idle_seconds = self.config.get("auto_ocr_idle_seconds", 2)
+        busy_for = idle_seconds - (time.monotonic() - self.last_user_activity)
+        if busy_for > 0:
+            self.schedule_auto_ocr(busy_for)
+            return
         
-        # 在新线程中运行OCR
-        thread = threading.Thread(target=ocr_thread)
-        thread.daemon = True
-        thread.start()
+        image_path = self.auto_ocr_queue.popleft()
+        
+        def finish():
+            self.auto_ocr_pending.discard(image_path)
+            self.auto_ocr_task_handle = None
+            self.schedule_auto_ocr(0)
+        
+        def on_done(processed):
+            finish()
+            if processed:
+                self.status_var.set(f"后台OCR完成: {os.path.basename(image_path)}"
+                                    f"（剩余 {len(self.auto_ocr_queue)} 个）")
+                self.events.publish("modified", image_path)
+        
+        def on_error(e):
+            finish()
+            self.status_var.set(f"后台OCR失败: {os.path.basename(image_path)}")
+        
+        self.auto_ocr_task_handle = self.scheduler.submit(
+            f"后台OCR {os.path.basename(image_path)}",
+            lambda task: self.auto_ocr_task(task, image_path),
+            pool="cpu", priority=PRIORITY_BACKGROUND,
+            on_done=on_done, on_error=on_error, on_cancel=finish)
+    
+    def stop_auto_ocr(self):
+        """清空自动OCR队列并取消正在进行的识别，返回是否有被停止的图片"""
+        stopped = bool(self.auto_ocr_pending)
+        self.auto_ocr_queue.clear()
+        self.auto_ocr_pending.clear()
+        if self.auto_ocr_timer is not None:
+            self.root.after_cancel(self.auto_ocr_timer)
+            self.auto_ocr_timer = None
+        if self.auto_ocr_task_handle is not None:
+            self.auto_ocr_task_handle.cancel()
+        return stopped
     
-    def show_ocr_result(self, text, filename):
+    def auto_ocr_task(self, task, image_path):
+        """后台OCR任务：识别一张图片并写入搜索索引"""
+        task.check_cancelled()
+        if not self.config.get("ocr_enabled", True) or not os.path.exists(image_path):
+            return False
+        
+        text, scale, words = self.run_ocr(image_path, nice=10)
+        task.check_cancelled()
+        self.save_ocr_result(image_path, text, words)
+        return True
+    
+    def build_ocr_words(self, data, scale, image_width, image_height):
+        """将image_to_data结果整理为按列存储的词级数据（坐标换算回原图）"""
+        keep = [i for i, word in enumerate(data['text'])
+                if data['level'][i] == 5 and word.strip()]
+        
+        def column(key, dtype):
+            return np.array([data[key][i] for i in keep], dtype=dtype)
+        
+        return {
+            "text": np.array([data['text'][i].strip() for i in keep], dtype=str),
+            "left": np.round(column('left', np.float32) / scale).astype(np.int32),
+            "top": np.round(column('top', np.float32) / scale).astype(np.int32),
+            "width": np.round(column('width', np.float32) / scale).astype(np.int32),
+            "height": np.round(column('height', np.float32) / scale).astype(np.int32),
+            "conf": np.round(column('conf', np.float32)).astype(np.int16),
+            "block": column('block_num', np.int32),
+            "par": column('par_num', np.int32),
+            "line": column('line_num', np.int32),
+            "image_size": np.array([image_width, image_height], dtype=np.int32),
+        }
+    
+    def ocr_words_to_text(self, words):
+        """由词级数据重建纯文本（同一行的词拼接，段落之间换行）"""
+        def is_cjk(char):
+            return '\u2e80' <= char <= '\u9fff' or '\uff00' <= char <= '\uffef'
+        
+        lines = []
+        current_key = None
+        current_par = None
+        for i, word in enumerate(words["text"]):
+            key = (int(words["block"][i]), int(words["par"][i]), int(words["line"][i]))
+            if key != current_key:
+                if current_par is not None and key[:2] != current_par:
+                    lines.append("")
+                lines.append(word)
+                current_key = key
+                current_par = key[:2]
+            elif is_cjk(lines[-1][-1]) and is_cjk(word[0]):
+                lines[-1] += word
+            else:
+                lines[-1] += " " + word
+        return "\n".join(lines)
+    
+    def show_ocr_result(self, text, filename, scale=1.0, words=None):
         """显示OCR结果"""
-        self.status_var.set("OCR识别完成")
+        self.status_var.set(f"OCR识别完成（分辨率缩放 {scale:.2f}x）")
         
         # 创建结果窗口
         result_window = tk.Toplevel(self.root)
@@ -1540,7 +5375,7 @@ class WrongQuestionTool:
         text_frame = ttk.Frame(result_window)
         text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        ttk.Label(text_frame, text="识别到的文字:").pack(anchor=tk.W)
+        ttk.Label(text_frame, text=f"识别到的文字（分辨率缩放 {scale:.2f}x）:").pack(anchor=tk.W)
         
         text_widget = tk.Text(text_frame, wrap=tk.WORD)
         text_widget.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -1554,16 +5389,17 @@ class WrongQuestionTool:
             text_content = text_widget.get(1.0, tk.END).strip()
             if text_content:
                 # 保存为文本文件
-                base_name = os.path.splitext(filename)[0]
-                text_file = os.path.join(self.current_path, f"{base_name}_ocr.txt")
+                image_path = os.path.join(self.current_path, filename)
+                text_file = self.get_ocr_text_path(image_path)
                 
                 try:
-                    with open(text_file, 'w', encoding='utf-8') as f:
-                        f.write(text_content)
+                    # 手动修改过的文字与识别出的词框不再对应，只保存文字
+                    edited = text_content != text.strip()
+                    self.save_ocr_result(image_path, text_content, None if edited else words)
                     
                     messagebox.showinfo("保存成功", f"OCR结果已保存到: {text_file}")
                     result_window.destroy()
-                    self.refresh_file_list()
+                    self.events.publish("modified", image_path)
                 except Exception as e:
                     messagebox.showerror("保存失败", f"保存OCR结果失败: {str(e)}")
             else:
@@ -1587,7 +5423,7 @@ class WrongQuestionTool:
         # 选择导出范围
         export_window = tk.Toplevel(self.root)
         export_window.title("导出PDF")
-        export_window.geometry("400x300")
+        export_window.geometry("420x540")
         export_window.transient(self.root)
         export_window.grab_set()
         
@@ -1602,6 +5438,8 @@ class WrongQuestionTool:
                        variable=export_var, value="subject").pack(anchor=tk.W, padx=20, pady=5)
         ttk.Radiobutton(export_window, text="选择文件和文件夹", 
                        variable=export_var, value="selected").pack(anchor=tk.W, padx=20, pady=5)
+        ttk.Radiobutton(export_window, text="每个学科/子文件夹单独导出（并行）",
+                       variable=export_var, value="each").pack(anchor=tk.W, padx=20, pady=5)
         
         # 学科选择（当选择按学科导出时显示）
         subject_frame = ttk.Frame(export_window)
@@ -1621,6 +5459,36 @@ class WrongQuestionTool:
         
         export_var.trace('w', on_export_option_change)
         
+        # 图片质量
+        profile_frame = ttk.Frame(export_window)
+        profile_frame.pack(fill=tk.X, padx=20, pady=5)
+        
+        ttk.Label(profile_frame, text="图片质量:").pack(side=tk.LEFT)
+        profile_labels = [profile["label"] for profile in EXPORT_PROFILES.values()]
+        current_profile = EXPORT_PROFILES.get(self.config.get("export_profile", "standard"), EXPORT_PROFILES["standard"])
+        profile_var = tk.StringVar(value=current_profile["label"])
+        ttk.Combobox(profile_frame, textvariable=profile_var, values=profile_labels,
+                     state="readonly", width=24).pack(side=tk.LEFT, padx=5)
+        
+        # 版面
+        layout_frame = ttk.Frame(export_window)
+        layout_frame.pack(fill=tk.X, padx=20, pady=5)
+        
+        ttk.Label(layout_frame, text="版面:").pack(side=tk.LEFT)
+        layout_var = tk.StringVar(value=self.config.get("export_layout", "single"))
+        ttk.Radiobutton(layout_frame, text="每页一题", variable=layout_var,
+                        value="single").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(layout_frame, text="紧凑排版（每页多题）", variable=layout_var,
+                        value="compact").pack(side=tk.LEFT, padx=5)
+        
+        # 可搜索PDF
+        searchable_var = tk.BooleanVar(value=self.config.get("export_searchable", False))
+        ttk.Checkbutton(export_window, text="可搜索PDF（OCR文字作为隐藏文字层，不单独成页）",
+                        variable=searchable_var).pack(anchor=tk.W, padx=20, pady=5)
+        
+        # 分卷
+        volume_vars = self.add_volume_options(export_window)
+        
         # 按钮
         button_frame = ttk.Frame(export_window)
         button_frame.pack(fill=tk.X, padx=20, pady=20)
@@ -1628,6 +5496,25 @@ class WrongQuestionTool:
         def do_export():
             export_type = export_var.get()
             
+            # 记住选择的图片质量和版面
+            for key, profile in EXPORT_PROFILES.items():
+                if profile["label"] == profile_var.get():
+                    self.config["export_profile"] = key
+            self.config["export_layout"] = layout_var.get()
+            self.config["export_searchable"] = searchable_var.get()
+            if not self.save_volume_options(volume_vars):
+                return
+            self.save_config()
+            
+            if export_type == "each":
+                # 当前目录下的每个子文件夹（在根目录时即每个学科）各导出一个PDF
+                output_dir = filedialog.askdirectory(title="选择保存文件夹", parent=export_window)
+                if not output_dir:
+                    return
+                export_window.destroy()
+                self.perform_multi_pdf_export(self.current_path, output_dir)
+                return
+            
             if export_type == "current":
                 export_paths = [self.current_path]
             elif export_type == "subject":
@@ -1656,6 +5543,8 @@ class WrongQuestionTool:
             
             if not output_file:
                 return
+            if not self.confirm_volume_overwrite([output_file], export_window):
+                return
             
             export_window.destroy()
             self.perform_pdf_export(export_paths, output_file)
@@ -1663,149 +5552,259 @@ class WrongQuestionTool:
         ttk.Button(button_frame, text="确定", command=do_export).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="取消", command=export_window.destroy).pack(side=tk.RIGHT, padx=5)
     
+    def add_volume_options(self, parent):
+        """在导出对话框中添加分卷选项，返回(是否分卷, 每卷页数, 每卷MB)变量"""
+        split_var = tk.BooleanVar(value=self.config.get("export_split", False))
+        pages_var = tk.StringVar(value=str(self.config.get("export_volume_pages", 200)))
+        mb_var = tk.StringVar(value=str(self.config.get("export_volume_mb", 100)))
+        
+        volume_frame = ttk.Frame(parent)
+        volume_frame.pack(fill=tk.X, padx=20, pady=5)
+        ttk.Checkbutton(volume_frame, text="分卷导出，每卷最多", variable=split_var).pack(side=tk.LEFT)
+        ttk.Entry(volume_frame, textvariable=pages_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(volume_frame, text="页 /").pack(side=tk.LEFT)
+        ttk.Entry(volume_frame, textvariable=mb_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(volume_frame, text="MB（0为不限）").pack(side=tk.LEFT)
+        ttk.Label(parent, text="不分卷时整个文档在内存中生成，题目很多时建议分卷导出",
+                  foreground="gray").pack(anchor=tk.W, padx=20)
+        return split_var, pages_var, mb_var
+    
+    def save_volume_options(self, volume_vars):
+        """校验并保存分卷选项，输入无效时提示并返回False"""
+        split_var, pages_var, mb_var = volume_vars
+        try:
+            volume_pages = int(pages_var.get() or 0)
+            volume_mb = float(mb_var.get() or 0)
+            if volume_pages < 0 or volume_mb < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("警告", "分卷页数和大小必须是非负数")
+            return False
+        
+        self.config["export_split"] = split_var.get()
+        self.config["export_volume_pages"] = volume_pages
+        self.config["export_volume_mb"] = volume_mb
+        return True
+    
+    def confirm_volume_overwrite(self, output_files, parent):
+        """分卷导出前检查同名的旧分卷文件，询问后删除；用户取消或删除失败时返回False
+        
+        旧分卷不删除会被新分卷逐个覆盖，多出的旧分卷还会与新导出的文件混在一起。
+        """
+        if self.get_volume_limits() == (0, 0):
+            return True
+        existing = [path for output_file in output_files for path in existing_volume_files(output_file)]
+        if not existing:
+            return True
+        if not messagebox.askyesno("文件已存在", f"目标位置已有 {len(existing)} 个同名的分卷文件"
+                                               f"（如 {os.path.basename(existing[0])}），继续导出将删除它们。是否继续？",
+                                   parent=parent):
+            return False
+        try:
+            for path in existing:
+                os.remove(path)
+        except OSError as e:
+            messagebox.showerror("错误", f"删除旧分卷失败: {str(e)}", parent=parent)
+            return False
+        return True
+    
+    def prune_render_cache(self):
+        """渲染缓存超过设定大小时淘汰最久未用的条目"""
+        self.render_cache.prune(int(self.config.get("render_cache_mb", 1024)) * 1024 * 1024)
+    
+    def get_volume_limits(self):
+        """返回(每卷页数, 每卷字节数)上限，不分卷时均为0"""
+        if not self.config.get("export_split", False):
+            return 0, 0
+        volume_pages = int(self.config.get("export_volume_pages", 200))
+        volume_bytes = int(float(self.config.get("export_volume_mb", 100)) * 1024 * 1024)
+        return volume_pages, volume_bytes
+    
+    def describe_export_files(self, files):
+        """导出完成提示中的文件说明"""
+        if len(files) == 1:
+            return files[0]
+        return f"{os.path.dirname(files[0])}（共{len(files)}卷）\n" + "\n".join(os.path.basename(f) for f in files)
+    
     def perform_pdf_export(self, export_paths, output_file):
         """执行PDF导出"""
         self.status_var.set("正在导出PDF...")
-        self.progress.start()
         
-        def export_thread():
-            try:
-                c = canvas.Canvas(output_file, pagesize=A4)
-                width, height = A4
-                
-                for path in export_paths:
-                    if os.path.isdir(path):
-                        # 导出文件夹
-                        self.export_folder_to_pdf(c, path, width, height)
-                    else:
-                        # 导出单个文件
-                        self.export_file_to_pdf(c, path, width, height)
-                
-                c.save()
-                self.root.after(0, lambda: messagebox.showinfo("导出完成", f"PDF已导出到: {output_file}"))
-                self.root.after(0, lambda: self.status_var.set("PDF导出完成"))
-                
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("导出错误", f"PDF导出失败: {str(e)}"))
-                self.root.after(0, lambda: self.status_var.set("PDF导出失败"))
-            finally:
-                self.root.after(0, lambda: self.progress.stop())
+        profile = EXPORT_PROFILES.get(self.config.get("export_profile", "standard"), EXPORT_PROFILES["standard"])
+        layout = self.config.get("export_layout", "single")
+        searchable = self.config.get("export_searchable", False)
         
-        thread = threading.Thread(target=export_thread)
-        thread.daemon = True
-        thread.start()
-    
-    def export_folder_to_pdf(self, canvas_obj, folder_path, page_width, page_height):
-        """导出文件夹到PDF"""
-        items = os.listdir(folder_path)
-        items.sort()
+        volume_pages, volume_bytes = self.get_volume_limits()
         
-        for item in items:
-            item_path = os.path.join(folder_path, item)
-            
-            if os.path.isdir(item_path):
-                # 子文件夹
-                self.export_folder_to_pdf(canvas_obj, item_path, page_width, page_height)
-            else:
-                # 文件
-                self.export_file_to_pdf(canvas_obj, item_path, page_width, page_height)
+        def export_task(task):
+            exporter = PdfExporter(output_file, profile, task=task, workers=self.scheduler.item_workers["cpu"],
+                                   layout=layout, image_info=self.image_info, searchable=searchable,
+                                   volume_pages=volume_pages, volume_bytes=volume_bytes,
+                                   render_cache=self.render_cache, item_pool=self.scheduler.item_pool("cpu"))
+            files = exporter.run(export_paths)
+            self.prune_render_cache()
+            return files
+        
+        def on_done(files):
+            messagebox.showinfo("导出完成", f"PDF已导出到: {self.describe_export_files(files)}")
+            self.status_var.set("PDF导出完成")
+        
+        def on_error(e):
+            messagebox.showerror("导出错误", f"PDF导出失败: {str(e)}")
+            self.status_var.set("PDF导出失败")
+        
+        self.scheduler.submit("导出PDF", export_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("PDF导出已取消，未完成的文件已删除"))
     
-    def export_file_to_pdf(self, canvas_obj, file_path, page_width, page_height):
-        """导出单个文件到PDF"""
-        filename = os.path.basename(file_path)
+    def perform_multi_pdf_export(self, base_path, output_dir):
+        """把base_path下的每个子文件夹并行导出为独立的PDF，并写出导出清单"""
+        folders = [os.path.join(base_path, name) for name in sorted(os.listdir(base_path))
+                   if os.path.isdir(os.path.join(base_path, name))]
+        # 跳过没有任何文件的文件夹
+        folders = [folder for folder in folders
+                   if any(files for _, _, files in os.walk(folder))]
+        if not folders:
+            messagebox.showwarning("警告", "当前目录下没有可导出的子文件夹")
+            return
+        if not self.confirm_volume_overwrite(
+                [os.path.join(output_dir, f"{os.path.basename(folder)}.pdf") for folder in folders], self.root):
+            return
         
-        if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
-            # 图片文件
-            try:
-                # 添加标题
-                canvas_obj.setFont("Helvetica-Bold", 16)
-                canvas_obj.drawString(50, page_height - 50, filename)
-                
-                # 添加图片
-                img = ImageReader(file_path)
-                img_width, img_height = img.getSize()
-                
-                # 计算图片显示尺寸
-                max_width = page_width - 100
-                max_height = page_height - 150
-                
-                ratio = min(max_width/img_width, max_height/img_height)
-                display_width = img_width * ratio
-                display_height = img_height * ratio
-                
-                x = (page_width - display_width) / 2
-                y = (page_height - display_height) / 2 - 50
-                
-                canvas_obj.drawImage(img, x, y, width=display_width, height=display_height)
-                
-                # 检查是否有OCR文本
-                base_name = os.path.splitext(filename)[0]
-                ocr_file = os.path.join(os.path.dirname(file_path), f"{base_name}_ocr.txt")
-                
-                if os.path.exists(ocr_file):
-                    # 添加OCR文本
-                    try:
-                        with open(ocr_file, 'r', encoding='utf-8') as f:
-                            ocr_text = f.read()
-                        
-                        canvas_obj.showPage()
-                        canvas_obj.setFont("Helvetica", 12)
-                        canvas_obj.drawString(50, page_height - 50, f"OCR识别结果 - {filename}")
-                        
-                        # 文本换行处理
-                        lines = ocr_text.split('\n')
-                        y_position = page_height - 80
-                        
-                        for line in lines:
-                            if y_position < 50:
-                                canvas_obj.showPage()
-                                canvas_obj.setFont("Helvetica", 12)
-                                y_position = page_height - 50
-                            
-                            canvas_obj.drawString(50, y_position, line[:100])  # 限制每行长度
-                            y_position -= 20
-                    
-                    except Exception as e:
-                        print(f"读取OCR文件失败: {e}")
-                
-                canvas_obj.showPage()
-                
-            except Exception as e:
-                print(f"导出图片失败: {e}")
+        self.status_var.set("正在导出PDF...")
         
-        elif file_path.lower().endswith('.txt'):
-            # 文本文件
+        profile = EXPORT_PROFILES.get(self.config.get("export_profile", "standard"), EXPORT_PROFILES["standard"])
+        layout = self.config.get("export_layout", "single")
+        searchable = self.config.get("export_searchable", False)
+        volume_pages, volume_bytes = self.get_volume_limits()
+        
+        # 进程数不超过CPU核数，剩余核数分给每个进程内的图片准备线程
+        cpu_count = os.cpu_count() or 2
+        processes = max(1, min(len(folders), cpu_count))
+        workers = max(1, cpu_count // processes)
+        
+        def export_task(task):
+            start_time = time.perf_counter()
+            results = []
+            # 使用spawn启动子进程，避免在带界面和线程的进程中fork
+            context = multiprocessing.get_context("spawn")
+            # 跨进程的取消标志，子进程在每个检查点查看
+            manager = context.Manager()
+            cancel_event = manager.Event()
+            pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+            futures = [pool.submit(export_document, folder,
+                                   os.path.join(output_dir, f"{os.path.basename(folder)}.pdf"),
+                                   profile, layout, searchable, volume_pages, volume_bytes, workers,
+                                   self.render_cache.cache_dir, cancel_event)
+                       for folder in folders]
+            settle_lock = threading.Lock()
+            unsettled = len(futures)
+            stopped = False
+            
+            def discard_result(future):
+                """删除已完成文档写出的文件"""
+                if future.cancelled() or future.exception() is not None:
+                    return
+                for path in future.result()["files"]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            
+            def release_manager():
+                """所有子任务结束后关闭取消标志所在的管理进程"""
+                try:
+                    manager.shutdown()
+                except Exception:
+                    pass
+            
+            def on_settled(future):
+                # 取消后才完成的文档同样删除；最后一个子任务结束时释放管理进程
+                nonlocal unsettled
+                with settle_lock:
+                    unsettled -= 1
+                    last = unsettled == 0 and stopped
+                if stopped:
+                    discard_result(future)
+                if last:
+                    release_manager()
+            
+            for future in futures:
+                future.add_done_callback(on_settled)
+            
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                canvas_obj.setFont("Helvetica-Bold", 16)
-                canvas_obj.drawString(50, page_height - 50, filename)
-                
-                canvas_obj.setFont("Helvetica", 12)
-                lines = content.split('\n')
-                y_position = page_height - 80
-                
-                for line in lines:
-                    if y_position < 50:
-                        canvas_obj.showPage()
-                        canvas_obj.setFont("Helvetica", 12)
-                        y_position = page_height - 50
-                    
-                    canvas_obj.drawString(50, y_position, line[:100])
-                    y_position -= 20
-                
-                canvas_obj.showPage()
-                
-            except Exception as e:
-                print(f"导出文本文件失败: {e}")
+                pending = set(futures)
+                done = 0
+                while pending:
+                    task.check_cancelled()
+                    # 定时醒来检查取消，不必等到某个文档导出完成
+                    finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done += 1
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"导出PDF失败: {e}")
+                            continue
+                        results.append(result)
+                        task.report(done, len(futures), result["name"])
+                task.check_cancelled()
+            except BaseException:
+                # 通知子进程停止，不等待正在运行的文档；已写出的分学科文件一并删除
+                cancel_event.set()
+                with settle_lock:
+                    stopped = True
+                    last = unsettled == 0
+                pool.shutdown(wait=False, cancel_futures=True)
+                for future in futures:
+                    if future.done():
+                        discard_result(future)
+                if last:
+                    release_manager()
+                raise
+            
+            pool.shutdown()
+            release_manager()
+            
+            self.prune_render_cache()
+            results.sort(key=lambda result: folders.index(result["source"]))
+            manifest = {
+                "created_time": datetime.datetime.now().isoformat(),
+                "source": base_path,
+                "profile": self.config.get("export_profile", "standard"),
+                "layout": layout,
+                "documents": results,
+                "total_pages": sum(result["pages"] for result in results),
+                "total_bytes": sum(result["bytes"] for result in results),
+                "seconds": round(time.perf_counter() - start_time, 2)
+            }
+            manifest_file = os.path.join(output_dir, "导出清单.json")
+            with open(manifest_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            return manifest
+        
+        def on_done(manifest):
+            failed = len(folders) - len(manifest["documents"])
+            message = (f"已导出 {len(manifest['documents'])} 个PDF到: {output_dir}\n"
+                       f"共 {manifest['total_pages']} 页，{manifest['total_bytes'] / 1024 / 1024:.1f} MB，"
+                       f"用时 {manifest['seconds']} 秒")
+            if failed:
+                message += f"\n{failed} 个文件夹导出失败"
+            messagebox.showinfo("导出完成", message)
+            self.status_var.set("PDF导出完成")
+        
+        def on_error(e):
+            messagebox.showerror("导出错误", f"PDF导出失败: {str(e)}")
+            self.status_var.set("PDF导出失败")
+        
+        self.scheduler.submit("分学科导出PDF", export_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("PDF导出已取消"))
     
     def export_word(self):
         """导出Word文档"""
         # 选择导出范围（与PDF类似）
         export_window = tk.Toplevel(self.root)
         export_window.title("导出Word")
-        export_window.geometry("400x300")
+        export_window.geometry("420x460")
         export_window.transient(self.root)
         export_window.grab_set()
         
@@ -1837,12 +5836,46 @@ class WrongQuestionTool:
         
         export_var.trace('w', on_export_option_change)
         
+        # 图片质量
+        profile_frame = ttk.Frame(export_window)
+        profile_frame.pack(fill=tk.X, padx=20, pady=5)
+        
+        ttk.Label(profile_frame, text="图片质量:").pack(side=tk.LEFT)
+        profile_labels = [profile["label"] for profile in EXPORT_PROFILES.values()]
+        current_profile = EXPORT_PROFILES.get(self.config.get("export_profile", "standard"), EXPORT_PROFILES["standard"])
+        profile_var = tk.StringVar(value=current_profile["label"])
+        ttk.Combobox(profile_frame, textvariable=profile_var, values=profile_labels,
+                     state="readonly", width=24).pack(side=tk.LEFT, padx=5)
+        
+        # 版面
+        layout_frame = ttk.Frame(export_window)
+        layout_frame.pack(fill=tk.X, padx=20, pady=5)
+        
+        ttk.Label(layout_frame, text="版面:").pack(side=tk.LEFT)
+        layout_var = tk.StringVar(value=self.config.get("word_layout", "single"))
+        ttk.Radiobutton(layout_frame, text="每页一题", variable=layout_var,
+                        value="single").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(layout_frame, text="紧凑表格（每页多题）", variable=layout_var,
+                        value="compact").pack(side=tk.LEFT, padx=5)
+        
+        # 分卷
+        volume_vars = self.add_volume_options(export_window)
+        
         button_frame = ttk.Frame(export_window)
         button_frame.pack(fill=tk.X, padx=20, pady=20)
         
         def do_export():
             export_type = export_var.get()
             
+            # 记住选择的图片质量和版面
+            for key, profile in EXPORT_PROFILES.items():
+                if profile["label"] == profile_var.get():
+                    self.config["export_profile"] = key
+            self.config["word_layout"] = layout_var.get()
+            if not self.save_volume_options(volume_vars):
+                return
+            self.save_config()
+            
             if export_type == "current":
                 export_paths = [self.current_path]
             elif export_type == "subject":
@@ -1869,6 +5902,8 @@ class WrongQuestionTool:
             
             if not output_file:
                 return
+            if not self.confirm_volume_overwrite([output_file], export_window):
+                return
             
             export_window.destroy()
             self.perform_word_export(export_paths, output_file)
@@ -1879,96 +5914,30 @@ class WrongQuestionTool:
     def perform_word_export(self, export_paths, output_file):
         """执行Word导出"""
         self.status_var.set("正在导出Word...")
-        self.progress.start()
-        
-        def export_thread():
-            try:
-                doc = Document()
-                
-                for path in export_paths:
-                    if os.path.isdir(path):
-                        # 导出文件夹
-                        self.export_folder_to_word(doc, path)
-                    else:
-                        # 导出单个文件
-                        self.export_file_to_word(doc, path)
-                
-                doc.save(output_file)
-                self.root.after(0, lambda: messagebox.showinfo("导出完成", f"Word文档已导出到: {output_file}"))
-                self.root.after(0, lambda: self.status_var.set("Word导出完成"))
-                
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("导出错误", f"Word导出失败: {str(e)}"))
-                self.root.after(0, lambda: self.status_var.set("Word导出失败"))
-            finally:
-                self.root.after(0, lambda: self.progress.stop())
-        
-        thread = threading.Thread(target=export_thread)
-        thread.daemon = True
-        thread.start()
-    
-    def export_folder_to_word(self, doc, folder_path):
-        """导出文件夹到Word"""
-        items = os.listdir(folder_path)
-        items.sort()
-        
-        folder_name = os.path.basename(folder_path)
-        doc.add_heading(f'文件夹: {folder_name}', level=1)
-        
-        for item in items:
-            item_path = os.path.join(folder_path, item)
-            
-            if os.path.isdir(item_path):
-                # 子文件夹
-                self.export_folder_to_word(doc, item_path)
-            else:
-                # 文件
-                self.export_file_to_word(doc, item_path)
-    
-    def export_file_to_word(self, doc, file_path):
-        """导出单个文件到Word"""
-        filename = os.path.basename(file_path)
-        
-        if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
-            # 图片文件
-            try:
-                doc.add_heading(filename, level=2)
-                
-                # 添加图片
-                doc.add_picture(file_path, width=Inches(6))
-                
-                # 检查是否有OCR文本
-                base_name = os.path.splitext(filename)[0]
-                ocr_file = os.path.join(os.path.dirname(file_path), f"{base_name}_ocr.txt")
-                
-                if os.path.exists(ocr_file):
-                    # 添加OCR文本
-                    try:
-                        with open(ocr_file, 'r', encoding='utf-8') as f:
-                            ocr_text = f.read()
-                        
-                        doc.add_heading('OCR识别结果', level=3)
-                        doc.add_paragraph(ocr_text)
-                    except Exception as e:
-                        print(f"读取OCR文件失败: {e}")
-                
-                doc.add_page_break()
-                
-            except Exception as e:
-                print(f"导出图片失败: {e}")
         
-        elif file_path.lower().endswith('.txt'):
-            # 文本文件
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                doc.add_heading(filename, level=2)
-                doc.add_paragraph(content)
-                doc.add_page_break()
-                
-            except Exception as e:
-                print(f"导出文本文件失败: {e}")
+        profile = EXPORT_PROFILES.get(self.config.get("export_profile", "standard"), EXPORT_PROFILES["standard"])
+        layout = self.config.get("word_layout", "single")
+        volume_pages, volume_bytes = self.get_volume_limits()
+        
+        def export_task(task):
+            exporter = WordExporter(output_file, profile, task=task, workers=self.scheduler.item_workers["cpu"],
+                                    layout=layout, volume_pages=volume_pages, volume_bytes=volume_bytes,
+                                    image_info=self.image_info, render_cache=self.render_cache,
+                                    item_pool=self.scheduler.item_pool("cpu"))
+            files = exporter.run(export_paths)
+            self.prune_render_cache()
+            return files
+        
+        def on_done(files):
+            messagebox.showinfo("导出完成", f"Word文档已导出到: {self.describe_export_files(files)}")
+            self.status_var.set("Word导出完成")
+        
+        def on_error(e):
+            messagebox.showerror("导出错误", f"Word导出失败: {str(e)}")
+            self.status_var.set("Word导出失败")
+        
+        self.scheduler.submit("导出Word", export_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("Word导出已取消，未完成的文件已删除"))
     
     def export_selected(self):
         """导出选中的项目"""
@@ -2027,7 +5996,7 @@ class WrongQuestionTool:
         ocr_frame.pack(fill=tk.X, padx=10, pady=5)
         
         ocr_enabled_var = tk.BooleanVar(value=self.config.get("ocr_enabled", True))
-        ttk.Checkbutton(ocr_frame, text="启用OCR功能", 
+        ttk.Checkbutton(ocr_frame, text="启用自动OCR（导入或编辑图片后在空闲时识别）", 
                        variable=ocr_enabled_var).pack(anchor=tk.W, padx=5, pady=2)
         
         # 图片质量设置
@@ -2217,7 +6186,7 @@ class WrongQuestionTool:
                 
                 messagebox.showinfo("成功", "标签已保存")
                 tag_window.destroy()
-                self.refresh_file_list()
+                self.events.publish("modified", os.path.join(self.current_path, filename))
                 
             except Exception as e:
                 messagebox.showerror("错误", f"保存标签失败: {str(e)}")
@@ -2233,16 +6202,17 @@ class WrongQuestionTool:
         self.add_tags()
     
     def batch_rename(self):
-        """批量重命名"""
-        selection = self.file_tree.selection()
-        if not selection:
+        """批量重命名（附属文件一起改名，两阶段执行，可从中断中恢复）"""
+        directory = self.current_path
+        names = [os.path.basename(path) for path in self.get_selected_paths() if os.path.dirname(path) == directory]
+        if not names:
             messagebox.showwarning("警告", "请先选择要重命名的文件")
             return
         
         # 重命名窗口
         rename_window = tk.Toplevel(self.root)
         rename_window.title("批量重命名")
-        rename_window.geometry("500x400")
+        rename_window.geometry("600x480")
         rename_window.transient(self.root)
         rename_window.grab_set()
         
@@ -2272,56 +6242,104 @@ class WrongQuestionTool:
         preview_frame = ttk.LabelFrame(rename_window, text="预览")
         preview_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
-        preview_text = tk.Text(preview_frame, height=10)
-        preview_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        columns = ("old", "new", "status")
+        preview_tree = ttk.Treeview(preview_frame, columns=columns, show="headings", height=10)
+        preview_tree.heading("old", text="原名称")
+        preview_tree.heading("new", text="新名称")
+        preview_tree.heading("status", text="状态")
+        preview_tree.column("old", width=200)
+        preview_tree.column("new", width=200)
+        preview_tree.column("status", width=140)
+        preview_scrollbar = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=preview_tree.yview)
+        preview_tree.configure(yscrollcommand=preview_scrollbar.set)
+        preview_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        preview_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        summary_var = tk.StringVar()
+        ttk.Label(rename_window, textvariable=summary_var).pack(anchor=tk.W, padx=20)
+        
+        # 预览行只创建一次，之后只更新内容有变化的行
+        for index, filename in enumerate(names):
+            preview_tree.insert("", "end", iid=str(index), values=(filename, "", ""))
+        preview_state = {"plan": ([], {}), "after_id": None, "rows": {}}
+        
+        def build_renames():
+            try:
+                counter = start_num_var.get()
+                digits = digit_count_var.get()
+            except tk.TclError:
+                return None
+            renames = []
+            for filename in names:
+                name, ext = os.path.splitext(filename)
+                renames.append((filename, f"{prefix_var.get()}{name}{suffix_var.get()}_{counter:0{digits}d}{ext}"))
+                counter += 1
+            return renames
         
         def update_preview():
-            preview_text.delete(1.0, tk.END)
-            counter = start_num_var.get()
-            
-            for item in selection:
-                filename = self.file_tree.item(item, "values")[0]
-                if filename != "返回上一级":
-                    name, ext = os.path.splitext(filename)
-                    new_name = f"{prefix_var.get()}{name}{suffix_var.get()}_{counter:0{digit_count_var.get()}d}{ext}"
-                    preview_text.insert(tk.END, f"{filename} -> {new_name}\n")
-                    counter += 1
+            preview_state["after_id"] = None
+            renames = build_renames()
+            if renames is None:
+                return
+            groups, conflicts = plan_batch_rename(directory, renames)
+            preview_state["plan"] = (groups, conflicts)
+            for index, (filename, new_name) in enumerate(renames):
+                row = (filename, new_name, conflicts.get(filename, "未改变" if new_name == filename else ""))
+                if preview_state["rows"].get(index) != row:
+                    preview_tree.item(str(index), values=row)
+                    preview_state["rows"][index] = row
+            summary_var.set(f"将重命名 {len(groups)} 项" + (f"，{len(conflicts)} 项有冲突将保留原名" if conflicts else ""))
+        
+        def schedule_preview(*args):
+            # 连续输入时合并为一次预览计算
+            if preview_state["after_id"] is not None:
+                rename_window.after_cancel(preview_state["after_id"])
+            preview_state["after_id"] = rename_window.after(150, update_preview)
         
         # 绑定预览更新
-        prefix_var.trace('w', lambda *args: update_preview())
-        suffix_var.trace('w', lambda *args: update_preview())
-        start_num_var.trace('w', lambda *args: update_preview())
-        digit_count_var.trace('w', lambda *args: update_preview())
+        for var in (prefix_var, suffix_var, start_num_var, digit_count_var):
+            var.trace('w', schedule_preview)
         
         # 按钮
         button_frame = ttk.Frame(rename_window)
         button_frame.pack(pady=10)
         
         def apply_rename():
-            try:
-                counter = start_num_var.get()
-                renamed_count = 0
-                
-                for item in selection:
-                    filename = self.file_tree.item(item, "values")[0]
-                    if filename != "返回上一级":
-                        old_path = os.path.join(self.current_path, filename)
-                        name, ext = os.path.splitext(filename)
-                        new_name = f"{prefix_var.get()}{name}{suffix_var.get()}_{counter:0{digit_count_var.get()}d}{ext}"
-                        new_path = os.path.join(self.current_path, new_name)
-                        
-                        if not os.path.exists(new_path):
-                            os.rename(old_path, new_path)
-                            renamed_count += 1
-                        
-                        counter += 1
-                
-                messagebox.showinfo("完成", f"成功重命名 {renamed_count} 个文件")
-                rename_window.destroy()
-                self.refresh_file_list()
-                
-            except Exception as e:
+            if preview_state["after_id"] is not None:
+                rename_window.after_cancel(preview_state["after_id"])
+                update_preview()
+            groups, conflicts = preview_state["plan"]
+            if not groups:
+                messagebox.showwarning("警告", "没有可以重命名的文件", parent=rename_window)
+                return
+            if conflicts and not messagebox.askyesno(
+                    "存在冲突", f"{len(conflicts)} 项因名称冲突将保留原名，是否继续重命名其余 {len(groups)} 项？",
+                    parent=rename_window):
+                return
+            rename_window.destroy()
+            operation = self.begin_app_operation([directory])
+            
+            def rename_task(task):
+                renamed = execute_batch_rename(directory, groups, self.rename_journal, task)
+                self.versions.move_history(renamed)
+                return renamed
+            
+            def on_done(renamed):
+                self.events.publish_batch([("renamed", old_path, new_path) for old_path, new_path in renamed])
+                self.end_app_operation(operation)
+                self.status_var.set(f"成功重命名 {len(renamed)} 项")
+            
+            def on_error(e):
+                self.reload_library()
+                self.end_app_operation(operation)
                 messagebox.showerror("错误", f"重命名失败: {str(e)}")
+            
+            def on_cancel():
+                self.reload_library()
+                self.end_app_operation(operation)
+            
+            self.scheduler.submit("批量重命名", rename_task, pool="io", on_done=on_done, on_error=on_error,
+                                  on_cancel=on_cancel)
         
         ttk.Button(button_frame, text="应用重命名", command=apply_rename).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="取消", command=rename_window.destroy).pack(side=tk.LEFT, padx=5)
@@ -2333,25 +6351,254 @@ class WrongQuestionTool:
         update_preview()
     
     def create_backup(self):
-        """创建备份"""
-        try:
-            backup_dir = os.path.join(self.program_dir, "backup", datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            # 复制所有文件
-            if os.path.exists(self.cuoti_dir):
-                for item in os.listdir(self.cuoti_dir):
-                    src = os.path.join(self.cuoti_dir, item)
-                    dst = os.path.join(backup_dir, item)
-                    if os.path.isdir(src):
-                        shutil.copytree(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
+        """创建增量备份快照"""
+        self.status_var.set("正在创建备份...")
+        backup_dir = os.path.join(self.program_dir, "backup")
+        
+        def backup_task(task):
+            store = BackupStore(backup_dir)
+            return store.create_snapshot(self.cuoti_dir, task, item_pool=self.scheduler.item_pool("io"))
+        
+        def on_done(summary):
+            messagebox.showinfo("备份完成",
+                                f"备份快照已创建: {summary['name']}\n"
+                                f"共 {summary['files']} 个文件（{summary['total_bytes'] / 1024 / 1024:.1f} MB），"
+                                f"新增 {summary['new_objects']} 个（{summary['new_bytes'] / 1024 / 1024:.1f} MB），"
+                                f"用时 {summary['seconds']} 秒\n位置: {backup_dir}")
+            self.status_var.set("备份完成")
+        
+        def on_error(e):
+            messagebox.showerror("错误", f"创建备份失败: {str(e)}")
+            self.status_var.set("备份失败")
+        
+        self.scheduler.submit("创建备份", backup_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("备份已取消"))
+    
+    def create_archive_backup(self):
+        """创建zip压缩备份（可分卷）"""
+        output_file = filedialog.asksaveasfilename(
+            title="保存压缩备份",
+            defaultextension=".zip",
+            initialfile=f"CuoTi_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            filetypes=[("ZIP压缩包", "*.zip")]
+        )
+        if not output_file:
+            return
+        
+        volume_mb = simpledialog.askinteger("分卷大小", "每卷最大MB（0为不分卷）:",
+                                            initialvalue=self.config.get("backup_volume_mb", 0),
+                                            minvalue=0, parent=self.root)
+        if volume_mb is None:
+            return
+        self.config["backup_volume_mb"] = volume_mb
+        self.save_config()
+        
+        self.status_var.set("正在创建压缩备份...")
+        
+        def archive_task(task):
+            return create_backup_archive(self.cuoti_dir, output_file, volume_mb * 1024 * 1024, task,
+                                         workers=self.scheduler.item_workers["cpu"],
+                                         item_pool=self.scheduler.item_pool("cpu"))
+        
+        def on_done(summary):
+            messagebox.showinfo("备份完成",
+                                f"已打包 {summary['count']} 个文件，"
+                                f"{summary['bytes'] / 1024 / 1024:.1f} MB，用时 {summary['seconds']} 秒\n"
+                                f"{self.describe_export_files(summary['files'])}")
+            self.status_var.set("压缩备份完成")
+        
+        def on_error(e):
+            messagebox.showerror("错误", f"创建压缩备份失败: {str(e)}")
+            self.status_var.set("压缩备份失败")
+        
+        self.scheduler.submit("创建压缩备份", archive_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("压缩备份已取消，未完成的文件已删除"))
+    
+    def verify_backup(self):
+        """并行校验所有备份快照引用的文件内容"""
+        store = BackupStore(os.path.join(self.program_dir, "backup"))
+        if not store.list_snapshots():
+            messagebox.showinfo("提示", "还没有备份快照")
+            return
+        
+        self.status_var.set("正在验证备份...")
+        
+        def verify_task(task):
+            return store.verify(task=task, item_pool=self.scheduler.item_pool("io"))
+        
+        def on_done(result):
+            self.show_verify_result(result["checked"], result["missing"], result["corrupt"])
+            self.status_var.set("备份验证完成")
+        
+        def on_error(e):
+            messagebox.showerror("错误", f"验证备份失败: {str(e)}")
+            self.status_var.set("备份验证失败")
+        
+        self.scheduler.submit("验证备份", verify_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("备份验证已取消"))
+    
+    def verify_archive_backup(self):
+        """按卷内校验清单并行校验zip压缩备份"""
+        archive_files = filedialog.askopenfilenames(title="选择压缩备份（可多选分卷）",
+                                                    filetypes=[("ZIP压缩包", "*.zip")])
+        if not archive_files:
+            return
+        
+        self.status_var.set("正在验证压缩备份...")
+        
+        def verify_task(task):
+            checked, missing, corrupt = 0, [], []
+            task.report(0, len(archive_files), "")
+            with self.scheduler.item_pool("cpu") as pool:
+                futures = {pool.submit(verify_archive_volume, path): path for path in archive_files}
+                for done, future in enumerate(as_completed(futures), 1):
+                    task.check_cancelled()
+                    name = os.path.basename(futures[future])
+                    try:
+                        count, volume_missing, volume_corrupt = future.result()
+                    except Exception as e:
+                        # 没有校验清单或压缩包本身损坏
+                        print(f"验证压缩备份失败 {name}: {e}")
+                        corrupt.append(name)
+                        continue
+                    checked += count
+                    missing.extend(volume_missing)
+                    corrupt.extend(volume_corrupt)
+                    task.report(done, len(futures), name)
+            return checked, missing, corrupt
+        
+        def on_done(result):
+            self.show_verify_result(*result)
+            self.status_var.set("压缩备份验证完成")
+        
+        def on_error(e):
+            messagebox.showerror("错误", f"验证压缩备份失败: {str(e)}")
+            self.status_var.set("压缩备份验证失败")
+        
+        self.scheduler.submit("验证压缩备份", verify_task, pool="io", on_done=on_done, on_error=on_error,
+                              on_cancel=lambda: self.status_var.set("压缩备份验证已取消"))
+    
+    def show_verify_result(self, checked, missing, corrupt):
+        """显示备份验证结果"""
+        if not missing and not corrupt:
+            messagebox.showinfo("验证通过", f"已校验 {checked} 个文件，全部完好")
+            return
+        
+        lines = [f"已校验 {checked} 个文件，发现问题:"]
+        lines += [f"缺失: {path}" for path in missing[:20]]
+        lines += [f"损坏: {path}" for path in corrupt[:20]]
+        if len(missing) > 20 or len(corrupt) > 20:
+            lines.append("……")
+        messagebox.showwarning("验证发现问题", "\n".join(lines))
+    
+    def restore_backup(self):
+        """从备份快照恢复整个错题库、某个学科或选中的题目"""
+        store = BackupStore(os.path.join(self.program_dir, "backup"))
+        snapshots = store.list_snapshots()
+        if not snapshots:
+            messagebox.showinfo("提示", "还没有备份快照")
+            return
+        
+        restore_window = tk.Toplevel(self.root)
+        restore_window.title("恢复备份")
+        restore_window.geometry("420x300")
+        restore_window.transient(self.root)
+        restore_window.grab_set()
+        
+        snapshot_frame = ttk.Frame(restore_window)
+        snapshot_frame.pack(fill=tk.X, padx=20, pady=10)
+        ttk.Label(snapshot_frame, text="备份快照:").pack(side=tk.LEFT)
+        snapshot_var = tk.StringVar(value=snapshots[-1])
+        ttk.Combobox(snapshot_frame, textvariable=snapshot_var, values=snapshots[::-1],
+                     state="readonly", width=24).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(restore_window, text="恢复范围:").pack(anchor=tk.W, padx=20)
+        scope_var = tk.StringVar(value="all")
+        ttk.Radiobutton(restore_window, text="整个快照", variable=scope_var,
+                        value="all").pack(anchor=tk.W, padx=20, pady=5)
+        
+        subject_frame = ttk.Frame(restore_window)
+        subject_frame.pack(fill=tk.X, padx=20, pady=5)
+        ttk.Radiobutton(subject_frame, text="学科:", variable=scope_var, value="subject").pack(side=tk.LEFT)
+        subject_var = tk.StringVar()
+        subject_combo = ttk.Combobox(subject_frame, textvariable=subject_var, state="readonly", width=20)
+        subject_combo.pack(side=tk.LEFT, padx=5)
+        
+        def load_subjects(*args):
+            # 快照中的顶层文件夹
+            snapshot = store.load_snapshot(snapshot_var.get())
+            subject_combo.config(values=sorted(d for d in snapshot.get("dirs", []) if "/" not in d))
+        
+        snapshot_var.trace('w', load_subjects)
+        load_subjects()
+        
+        ttk.Radiobutton(restore_window, text="当前选中的题目（含OCR和元数据）", variable=scope_var,
+                        value="question").pack(anchor=tk.W, padx=20, pady=5)
+        ttk.Label(restore_window, text="只复制与当前文件不同的文件，不会删除快照中没有的文件",
+                  foreground="gray").pack(anchor=tk.W, padx=20, pady=5)
+        
+        def do_restore():
+            scope = scope_var.get()
+            if scope == "all":
+                selection = None
+            elif scope == "subject":
+                if not subject_var.get():
+                    messagebox.showwarning("警告", "请选择学科", parent=restore_window)
+                    return
+                selection = [subject_var.get()]
+            else:
+                tree_selection = self.file_tree.selection()
+                name = self.file_tree.item(tree_selection[0], "values")[0] if tree_selection else None
+                if not name or name == "返回上一级":
+                    messagebox.showwarning("警告", "请先在文件列表中选择一道题目", parent=restore_window)
+                    return
+                item_path = os.path.join(self.current_path, name)
+                selection = [os.path.relpath(path, self.cuoti_dir).replace(os.sep, "/")
+                             for path in question_files(item_path)]
             
-            messagebox.showinfo("备份完成", f"备份已创建: {backup_dir}")
+            if not messagebox.askyesno("确认恢复", "恢复会覆盖与快照不同的现有文件，确定继续吗？",
+                                       parent=restore_window):
+                return
+            restore_window.destroy()
             
-        except Exception as e:
-            messagebox.showerror("错误", f"创建备份失败: {str(e)}")
+            name = snapshot_var.get()
+            self.status_var.set("正在恢复备份...")
+            operation = self.begin_app_operation([self.cuoti_dir])
+            
+            def restore_task(task):
+                return store.restore(name, self.cuoti_dir, selection, task, item_pool=self.scheduler.item_pool("io"))
+            
+            def on_done(result):
+                message = f"已恢复 {result['restored']} 个文件，{result['unchanged']} 个文件无需恢复"
+                if result["corrupt"]:
+                    lines = sorted(result["corrupt"])[:10]
+                    if len(result["corrupt"]) > 10:
+                        lines.append(f"……共 {len(result['corrupt'])} 个")
+                    messagebox.showwarning("恢复完成", f"{message}\n以下文件的备份数据缺失或损坏，未恢复:\n"
+                                                      + "\n".join(lines))
+                else:
+                    messagebox.showinfo("恢复完成", message)
+                self.status_var.set("备份恢复完成")
+                # 恢复可能涉及整个错题目录，重新读取
+                self.reload_library()
+                self.end_app_operation(operation)
+            
+            def on_error(e):
+                messagebox.showerror("错误", f"恢复备份失败: {str(e)}")
+                self.status_var.set("备份恢复失败")
+                self.end_app_operation(operation)
+            
+            def on_cancel():
+                self.status_var.set("备份恢复已取消")
+                self.end_app_operation(operation)
+            
+            self.scheduler.submit("恢复备份", restore_task, pool="io", on_done=on_done, on_error=on_error,
+                                  on_cancel=on_cancel)
+        
+        button_frame = ttk.Frame(restore_window)
+        button_frame.pack(fill=tk.X, padx=20, pady=10)
+        ttk.Button(button_frame, text="恢复", command=do_restore).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=restore_window.destroy).pack(side=tk.RIGHT, padx=5)
     
     def show_statistics(self):
         """显示统计信息"""
@@ -2377,25 +6624,34 @@ class WrongQuestionTool:
             size_str = f"{total_size/(1024*1024*1024):.1f} GB"
         
         total_text += f"总大小: {size_str}\n"
-        total_text += f"学科数量: {len(self.stats['by_subject'])}"
+        total_text += f"学科数量: {len(self.stats['by_subject'])}\n"
+        total_text += f"标签数量: {len(self.stats['by_tag'])}"
         
         ttk.Label(total_frame, text=total_text, style='Header.TLabel').pack(pady=10)
         
-        # 按学科统计
-        subject_frame = ttk.LabelFrame(stats_window, text="按学科统计")
-        subject_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        
-        # 创建Treeview显示学科统计
-        subject_tree = ttk.Treeview(subject_frame, columns=("数量",), show="tree headings")
-        subject_tree.heading("#0", text="学科")
-        subject_tree.heading("数量", text="文件数量")
-        subject_tree.column("#0", width=200)
-        subject_tree.column("数量", width=100)
-        
-        for subject, count in sorted(self.stats['by_subject'].items()):
-            subject_tree.insert("", "end", text=subject, values=(count,))
+        # 按学科、标签、月份统计
+        notebook = ttk.Notebook(stats_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        subject_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        groups = [
+            ("按学科统计", "学科", sorted(self.stats['by_subject'].items())),
+            ("按标签统计", "标签", sorted(self.stats['by_tag'].items(), key=lambda item: (-item[1], item[0]))),
+            ("按月份统计", "月份（最后修改）", sorted(self.stats['by_month'].items(), reverse=True))
+        ]
+        for title, heading, rows in groups:
+            group_frame = ttk.Frame(notebook)
+            notebook.add(group_frame, text=title)
+            
+            group_tree = ttk.Treeview(group_frame, columns=("数量",), show="tree headings")
+            group_tree.heading("#0", text=heading)
+            group_tree.heading("数量", text="文件数量")
+            group_tree.column("#0", width=200)
+            group_tree.column("数量", width=100)
+            
+            for name, count in rows:
+                group_tree.insert("", "end", text=name, values=(count,))
+            
+            group_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         ttk.Button(stats_window, text="关闭", command=stats_window.destroy).pack(pady=10)
     
@@ -2465,6 +6721,8 @@ ESC - 取消当前操作
 
 def main():
     """主函数"""
+    # 打包后的程序中，多进程导出的子进程不再启动界面
+    multiprocessing.freeze_support()
     print("错题整理工具 v2.0.0")
     print("作者：mmm")
     print("赞助链接：https://gitee.com/orangearc655743/Wrong-Question-Tool.git")